@@ -1,17 +1,52 @@
 from dataclasses import dataclass
-from typing import Dict, List
+from typing import Dict, List, Optional, Tuple
 from enum import IntEnum
 
 @dataclass
 class CirculatingSupplyData:
-    total_supply: float
-    vault_balance: float
-    burned: float
-    fee_receiver_balance: float
-    claimable_fees: float
-    unclaimed_vests: float
-    receiver_allocations: float
-    eligible_lock_breaks: float
+    """Inputs to the circulating supply, all in wei"""
+    __slots__ = (
+        'total_supply', 'vault_balance', 'burned', 'fee_receiver_balance', 'claimable_fees',
+        'unclaimed_vests', 'receiver_allocations', 'eligible_lock_breaks',
+    )
+    total_supply: int
+    vault_balance: int
+    burned: int
+    fee_receiver_balance: int
+    claimable_fees: int
+    unclaimed_vests: int
+    receiver_allocations: int
+    eligible_lock_breaks: int
+
+    @property
+    def circulating(self) -> int:
+        return (
+            self.total_supply -
+            self.vault_balance -
+            self.burned -
+            self.fee_receiver_balance +
+            self.eligible_lock_breaks +
+            self.claimable_fees +
+            self.unclaimed_vests
+        )
+
+@dataclass(frozen=True)
+class AirdropConfig:
+    """
+    Describes how an airdrop's merkle tree is built from its source file. The weights are either split
+    pro rata over an AllocationRatios `allocation`, or converted at a named `rate`, see generate_merkle_roots.RATES.
+    """
+    name: str  # Used in the merkle file name
+    source_file: str
+    allocation: Optional[str] = None
+    rate: Optional[str] = None
+    records_key: Optional[str] = None  # Key holding the recipients, if not the top level of the file
+    weight_key: Optional[str] = None  # Field holding the weight when recipients map to objects
+    weight_total: Optional[int] = None  # Required sum of the weights
+    dust_policy: Optional[str] = None  # Defaults to Config.DUST_POLICY
+    dust_threshold: float = 1  # Total dust must stay below this, in wei
+    cap: Optional[Tuple[str, int]] = None  # (allocation, basis points) the airdrop total must stay under
+    fresh_after: Optional[int] = None  # Timestamp the source file's last_run must be after
 
 class AllocationRatios:
     # Basis points for each allocation (sum should be 6000 = 60%)
@@ -52,6 +87,7 @@ class ContractAddresses:
     VESTING = '0xC72bc1a8cf9b1A218386df641d8bE99B40436A0f'
     LOCKER = '0x3f78544364c3eCcDCe4d9C89a630AEa26122829d'
     VEST_MANAGER = '0x6666666677B06CB55EbF802BB12f8876360f919c'
+    MULTICALL3 = '0xcA11bde05977b3631167028862bE2a173976CA11'
 
 class Config:
     # Directory structure
@@ -59,10 +95,16 @@ class Config:
     MERKLE_DIR = f'{DATA_DIR}/merkle'
     SOURCES_DIR = f'{DATA_DIR}/sources'
     CACHE_DIR = f'{DATA_DIR}/cache'
+    BENCHMARK_DIR = f'{DATA_DIR}/benchmarks'
     
     # Cache data files
     USERS_LOCKS_FILE = f'{CACHE_DIR}/user_lock_data.json'
+    RECEIVERS_FILE = f'{CACHE_DIR}/receivers.json'
+    SUPPLY_TRACKER_FILE = f'{CACHE_DIR}/supply_tracker.json'
     SUPPLY_DATA_FILE = f'{CACHE_DIR}/supply_data.json'
+    LOG_CACHE_FILE = f'{CACHE_DIR}/logs.sqlite'
+    BLOCK_CACHE_FILE = f'{CACHE_DIR}/block_cache.json'
+    SUPPLY_SNAPSHOT_DIR = f'{CACHE_DIR}/supply_snapshots'
     
     # Source data files
     TEAM_SPLITS_FILE = f'{SOURCES_DIR}/team_splits.json'
@@ -74,16 +116,59 @@ class Config:
     TOTAL_SUPPLY = 100_000_000 * 10 ** 18
     BASIS_POINTS = 10_000
     DUST_THRESHOLD = 1e3
+    DUST_POLICY = 'smallest'  # One of utils.allocation.DUST_POLICIES
     LOCK_BREAK_START_BLOCK = 21_425_699  # Last block before December 18 00:00:00 UTC
     LOCK_BREAK_ELIGIBILITY_END_TIME = 1743033600  # 2025-03-27 00:00:00 UTC
 
     # Use AllocationRatios class
     ALLOCATION_RATIOS = AllocationRatios
 
+    # Airdrops built by generate_merkle_roots, in order. A new airdrop only needs an entry here
+    AIRDROPS = (
+        AirdropConfig('team', TEAM_SPLITS_FILE, allocation='TEAM', weight_total=BASIS_POINTS),
+        AirdropConfig(
+            'victims', VICTIM_DATA_FILE, allocation='VICTIMS', weight_key='final_loss',
+            dust_policy='smallest', dust_threshold=DUST_THRESHOLD,
+        ),
+        AirdropConfig(
+            'penalty', PENALTY_DATA_FILE, rate='redemption', records_key='data', weight_key='total_penalty',
+            cap=('REDEMPTIONS', 1_000), fresh_after=LOCK_BREAK_ELIGIBILITY_END_TIME,
+        ),
+    )
+
     # Block Numbers
     DEPLOY_BLOCK = 18029884
     LOCK_BREAK_START_BLOCK = 21_425_699
 
+    # RPC batching
+    MULTICALL_BATCH_SIZE = 500  # Reads per Multicall3 aggregate3 call
+    RPC_CONCURRENCY = 16  # Max concurrent requests from utils.async_rpc.AsyncRPC
+    RPC_RATE_LIMIT = 25  # Max requests started per second, 0 disables the limit
+    RPC_MAX_RETRIES = 5
+    RPC_BACKOFF = 0.5  # Seconds before the first retry, doubled on each attempt
+    RPC_TIMEOUT = 30
+    RPC_BATCH_SIZE = 100  # Requests per JSON-RPC batch
+    PROFILE = False  # Attach cProfile to instrumented runs, see utils.instrument
+    CLAIM_BATCH_SIZE = 200  # Claims in flight at once when simulating a full airdrop on a fork
+    REORG_DEPTH = 64  # Blocks below the head that caches treat as unfinalized
+
+    # Log fetching, see utils.eth.get_logs_chunked
+    LOGS_CHUNK_SIZE = 100_000  # Initial block window per get_logs request
+    LOGS_MAX_CHUNK_SIZE = 2_000_000
+    LOGS_SPARSE_THRESHOLD = 1_000  # Windows returning fewer logs than this are doubled
+    LOGS_WORKERS = 4  # Block ranges fetched concurrently
+
+    # Supply tracking, see utils.supply_tracker.SupplyTracker
+    SUPPLY_RECONCILE_INTERVAL = 7_200  # Blocks between full balance reads, about a day
+
+    # Merkle generation
+    MERKLE_HASH_BACKEND = 'eth_hash'  # One of utils.hashing.HASH_BACKENDS
+    MERKLE_WORKERS = 1  # Processes used to encode and hash large trees, 1 builds serially
+    MERKLE_COMPACT_LAYERS = False  # Store each tree layer in one contiguous buffer
+    MERKLE_OUTPUT_FORMAT = 'json'  # One of utils.merkle_io.MERKLE_FORMATS
+    MERKLE_INCREMENTAL = False  # Reuse the previous tree cached in CACHE_DIR, rehashing only changed paths
+    MERKLE_BUILD_WORKERS = 1  # Airdrop trees built at once, each in its own process
+
     # Supply Metrics
     SUPPLY_METRICS = {
         'Circulating PRISMA': 'amount of PRISMA + derivatives in circulation',
@@ -103,9 +188,30 @@ class Config:
     ]
 
     @classmethod
-    def get_merkle_file(cls, alloc_type: str) -> str:
-        """Returns the path to a merkle data file for a given allocation type"""
-        return f'{cls.MERKLE_DIR}/merkle_data_{alloc_type}.json'
+    def get_merkle_tree_cache_file(cls, alloc_type: str) -> str:
+        """Returns the path to the cached tree layers used for incremental merkle builds"""
+        return f'{cls.CACHE_DIR}/merkle_tree_{alloc_type}.json'
+
+    @classmethod
+    def get_run_summary_file(cls, script: str) -> str:
+        """Returns the file holding the instrumentation summary of a script's last run, next to the supply data"""
+        return f'{cls.CACHE_DIR}/{script}_run_summary.json'
+
+    @classmethod
+    def get_claim_status_file(cls, alloc_type: str) -> str:
+        """Returns the file tracking which claims of an airdrop have been made"""
+        return f'{cls.CACHE_DIR}/claim_status_{alloc_type}.json'
+
+    @classmethod
+    def get_supply_snapshot_file(cls, block: int) -> str:
+        """Returns the file holding the raw supply reads taken at a block"""
+        return f'{cls.SUPPLY_SNAPSHOT_DIR}/{block}.json'
+
+    @classmethod
+    def get_merkle_file(cls, alloc_type: str, fmt: str = None) -> str:
+        """Returns the path to a merkle data file for a given allocation type and output format"""
+        extension = {'ndjson': 'ndjson', 'binary': 'bin'}.get(fmt or cls.MERKLE_OUTPUT_FORMAT, 'json')
+        return f'{cls.MERKLE_DIR}/merkle_data_{alloc_type}.{extension}'
 
 class AirdropType(IntEnum):
     TEAM = 4
@@ -113,11 +219,11 @@ class AirdropType(IntEnum):
     PENALTY = 6
 
     @classmethod
-    def get_merkle_file(cls, airdrop_type: 'AirdropType') -> str:
+    def get_merkle_file(cls, airdrop_type: 'AirdropType', fmt: str = None) -> str:
         """Get merkle file path for a given airdrop type"""
         type_names = {
             cls.TEAM: 'team',
             cls.VICTIMS: 'victims',
             cls.PENALTY: 'penalty'
         }
-        return f'{Config.MERKLE_DIR}/merkle_data_{type_names[airdrop_type]}.json'
\ No newline at end of file
+        return Config.get_merkle_file(type_names[airdrop_type], fmt)
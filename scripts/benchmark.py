@@ -0,0 +1,278 @@
+import gc
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from eth_abi import decode, encode
+from eth_utils import function_signature_to_4byte_selector
+from config import Config
+from utils.allocation import allocate
+from utils.async_rpc import AsyncRPC
+from utils.merkle import MerkleTree, create_merkle, encode_leaves, verify_claims
+from utils.merkle_io import load_merkle_data
+
+DEFAULT_SIZES = (1_000, 100_000, 1_000_000)
+PROOF_SAMPLES = 1_000  # get_proof calls timed per tree
+RPC_CALLS = 1_000  # eth_calls sent to the stub RPC per run
+SUPPLY_USERS = 5_000  # Lock users read in the compute_supply snapshot benchmark
+SUPPLY_RECEIVERS = 100  # Emission receivers read in the compute_supply snapshot benchmark
+AGGREGATE3_SELECTOR = '0x82ad56cb'
+UINT_RESULT = (10 ** 18).to_bytes(32, 'big')
+
+
+def stub_response(request):
+    """Answers one JSON-RPC request with fixed results"""
+    method = request['method']
+    if method == 'eth_call':
+        data = request['params'][0]['data']
+        if data.startswith(AGGREGATE3_SELECTOR):
+            # Multicall3 aggregate3: every read succeeds with the same uint256
+            (calls,) = decode(['(address,bool,bytes)[]'], bytes.fromhex(data[10:]))
+            result = '0x' + encode(['(bool,bytes)[]'], [[(True, UINT_RESULT)] * len(calls)]).hex()
+        else:
+            result = '0x' + UINT_RESULT.hex()
+    elif method == 'eth_getCode':
+        result = '0x6080'
+    elif method == 'eth_blockNumber':
+        result = hex(20_000_000)
+    elif method == 'eth_getBlockByNumber':
+        result = {'number': request['params'][0], 'timestamp': hex(1_700_000_000 + int(request['params'][0], 16) * 12)}
+    else:
+        result = None
+    return {'jsonrpc': '2.0', 'id': request['id'], 'result': result}
+
+
+class StubRPCHandler(BaseHTTPRequestHandler):
+    """Answers JSON-RPC requests, single or batched, with fixed results and no network access"""
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        if isinstance(request, list):
+            response = [stub_response(item) for item in request]
+        else:
+            response = stub_response(request)
+        body = json.dumps(response).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class StubRPC:
+    """A local JSON-RPC endpoint for benchmarking the chain-dependent code paths"""
+
+    def __enter__(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), StubRPCHandler)
+        self.endpoint_uri = f'http://127.0.0.1:{self.server.server_port}'
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class StubCall:
+    """
+    Stands in for a brownie ContractCall returning a uint256, so Multicall can be benchmarked
+    without contract ABIs or a connected network
+    """
+
+    def __init__(self, address, signature):
+        self._address = address
+        self.selector = '0x' + function_signature_to_4byte_selector(signature).hex()
+        self.types = signature[signature.index('(') + 1:-1].split(',') if not signature.endswith('()') else []
+
+    def encode_input(self, *args):
+        return self.selector + encode(self.types, args).hex()
+
+    def decode_output(self, output):
+        return decode(['uint256'], bytes.fromhex(output[2:]))[0]
+
+
+def synthetic_distribution(size, seed=0):
+    """Returns {address: amount} for `size` random addresses"""
+    rng = random.Random(seed)
+    return {'0x' + rng.randbytes(20).hex(): rng.randrange(1, 10 ** 24) for _ in range(size)}
+
+
+def timed(name, size, func, repeat=1):
+    """Runs func `repeat` times and records the fastest run"""
+    times = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    result = {'name': name, 'size': size, 'seconds': min(times), 'runs': repeat}
+    print(f'{name:<28} {size:>10,} {result["seconds"]:>10.4f}s')
+    return result
+
+
+def bench_merkle(size, repeat):
+    """MerkleTree construction, get_proof, create_merkle end to end, and merkle file reads and writes"""
+    distribution = synthetic_distribution(size)
+    elements = [(account, index, amount) for index, (account, amount) in enumerate(distribution.items())]
+    nodes = encode_leaves(elements)
+    results = [timed('merkle_tree', size, lambda: MerkleTree(nodes), repeat)]
+
+    tree = MerkleTree(nodes)
+    samples = random.Random(1).sample(range(size), min(size, PROOF_SAMPLES))
+    sampled = [nodes[i] for i in samples]
+    result = timed('get_proof', len(samples), lambda: [tree.get_proof(node) for node in sampled], repeat)
+    results.append(dict(result, tree_size=size))
+    del tree
+
+    merkle_dir, cache_dir = Config.MERKLE_DIR, Config.CACHE_DIR
+    with tempfile.TemporaryDirectory() as tmp:
+        # Point the merkle output at a scratch directory for the end to end runs
+        Config.MERKLE_DIR, Config.CACHE_DIR = tmp, tmp
+        try:
+            total = sum(distribution.values())
+            results.append(timed('create_merkle', size, lambda: create_merkle(distribution, total, 'benchmark'), repeat))
+            path = Config.get_merkle_file('benchmark')
+            results.append(timed('merkle_file_read', size, lambda: load_merkle_data(path), repeat))
+            data = load_merkle_data(path)
+            copy = os.path.join(tmp, 'copy.json')
+
+            def write():
+                with open(copy, 'w') as f:
+                    json.dump(data, f, indent=4)
+            results.append(timed('merkle_file_write', size, write, repeat))
+            claims = list(data['claims'].items())
+            results.append(timed('verify_claims', size, lambda: verify_claims(claims, data['merkle_root'], 1), repeat))
+        finally:
+            Config.MERKLE_DIR, Config.CACHE_DIR = merkle_dir, cache_dir
+    return results
+
+
+def bench_allocation(size, repeat):
+    """The allocation engine generate_merkle_roots runs for each airdrop"""
+    weights = synthetic_distribution(size, seed=2)
+    total = Config.TOTAL_SUPPLY
+    return [
+        timed('allocate_smallest', size, lambda: allocate(weights, total, policy='smallest'), repeat),
+        timed('allocate_largest_remainder', size, lambda: allocate(weights, total, policy='largest_remainder'), repeat),
+        timed('allocate_rate', size, lambda: allocate(weights, rate=55 * 10 ** 15), repeat),
+    ]
+
+
+def bench_rpc(repeat):
+    """Concurrent eth_calls through AsyncRPC against a local stub, as used by compute_supply"""
+    with StubRPC() as stub:
+        rpc = AsyncRPC(stub.endpoint_uri, rate_limit=0)
+        calls = [('0x' + '00' * 20, '0x18160ddd')] * RPC_CALLS
+        return [timed('async_rpc_call_many', RPC_CALLS, lambda: rpc.call_many(calls, 20_000_000), repeat)]
+
+
+def bench_supply(repeat):
+    """
+    The compute_supply snapshot reads: the same mix of token reads, per-receiver allocations and
+    per-user boost delegation fees, batched through Multicall3 with AsyncRPC against a local stub.
+    """
+    from brownie import web3
+    from web3 import HTTPProvider
+    from utils.multicall import Multicall, decode_aggregate3, encode_aggregate3
+
+    rng = random.Random(3)
+    token, vault = ('0x' + rng.randbytes(20).hex() for _ in range(2))
+    users = ['0x' + rng.randbytes(20).hex() for _ in range(SUPPLY_USERS)]
+    receivers = ['0x' + rng.randbytes(20).hex() for _ in range(SUPPLY_RECEIVERS)]
+    total_supply = StubCall(token, 'totalSupply()')
+    balance_of = StubCall(token, 'balanceOf(address)')
+    allowance = StubCall(token, 'allowance(address,address)')
+    allocated = StubCall(vault, 'allocated(address)')
+    claimable_fees = StubCall(vault, 'claimableBoostDelegationFees(address)')
+
+    def add_reads(mc):
+        mc.add(total_supply)
+        for account in [vault] + users[:10]:
+            mc.add(balance_of, account)
+        mc.add(allowance, vault, users[0])
+        fees = [mc.add(claimable_fees, user) for user in users]
+        allocations = [mc.add(allocated, receiver) for receiver in receivers]
+        return fees, allocations
+
+    with StubRPC() as stub:
+        # Multicall checks for Multicall3 through brownie's web3, so point it at the stub for the run
+        provider = web3.provider
+        web3.provider = HTTPProvider(stub.endpoint_uri)
+        try:
+            def snapshot():
+                mc = Multicall(20_000_000, rpc=AsyncRPC(stub.endpoint_uri, rate_limit=0))
+                fees, allocations = add_reads(mc)
+                results = mc.execute()
+                return sum(results[i] for i in fees) + sum(results[i] for i in allocations)
+
+            mc = Multicall(20_000_000)
+            add_reads(mc)
+            calls = mc.calls
+            request = {'id': 0, 'method': 'eth_call', 'params': [{'data': encode_aggregate3(calls)}]}
+            response = bytes.fromhex(stub_response(request)['result'][2:])
+
+            def encode_decode():
+                encode_aggregate3(calls)
+                return decode_aggregate3(calls, response)
+            return [
+                timed('multicall_encode_decode', len(calls), encode_decode, repeat),
+                timed('supply_snapshot_reads', len(calls), snapshot, repeat),
+            ]
+        finally:
+            web3.provider = provider
+
+
+def get_version():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def main(sizes=None, repeat=1, output=None):
+    """
+    Benchmarks the main hot paths on synthetic distributions and writes the results as JSON, by
+    default to {BENCHMARK_DIR}/benchmark_<commit>.json so runs can be compared between versions.
+    Needs no network: `python -m scripts.benchmark 1000,100000`
+    """
+    if isinstance(sizes, str):
+        sizes = [int(size) for size in sizes.split(',')]
+    sizes = sizes or DEFAULT_SIZES
+    repeat = int(repeat)
+    version = get_version()
+
+    results = []
+    for size in sizes:
+        results += bench_merkle(size, repeat)
+        results += bench_allocation(size, repeat)
+    results += bench_rpc(repeat)
+    results += bench_supply(repeat)
+
+    report = {
+        'version': version,
+        'timestamp': int(time.time()),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'hash_backend': Config.MERKLE_HASH_BACKEND,
+        'results': results,
+    }
+    output = output or f'{Config.BENCHMARK_DIR}/benchmark_{version}.json'
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f'Benchmark results written to {output}')
+    return report
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
@@ -0,0 +1,34 @@
+import gc
+import random
+import tracemalloc
+from utils.merkle import MerkleTree, encode_leaves
+
+
+def main(num_leaves=100_000):
+    """
+    Compares memory used by a MerkleTree built with per-node bytes objects against
+    one built with contiguous compact layers, on a synthetic distribution.
+    """
+    num_leaves = int(num_leaves)
+    rng = random.Random(0)
+    nodes = encode_leaves([
+        ('0x' + rng.randbytes(20).hex(), index, rng.randrange(1, 10 ** 24))
+        for index in range(num_leaves)
+    ])
+
+    results = {}
+    for name, compact in [('list', False), ('compact', True)]:
+        gc.collect()
+        tracemalloc.start()
+        tree = MerkleTree(nodes, compact=compact)
+        retained, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        results[name] = {'retained': retained, 'peak': peak, 'root': tree.root}
+        del tree
+
+    assert results['list']['root'] == results['compact']['root'], 'Compact tree root mismatch'
+    print(f'Merkle tree memory for {num_leaves:,} leaves')
+    for name, result in results.items():
+        print(f'{name:>8}: retained {result["retained"] / 2**20:,.1f} MiB, peak {result["peak"] / 2**20:,.1f} MiB')
+    print(f'Raw node data: {(2 * num_leaves - 1) * 32 / 2**20:,.1f} MiB')
+    return results
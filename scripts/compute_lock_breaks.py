@@ -1,7 +1,9 @@
-from brownie import Contract, chain, web3
+from brownie import Contract, web3
 from config import Config, ContractAddresses
 from utils.utils import func_timer
-from utils.eth import closest_block_before_timestamp
+from utils.instrument import instrument, instrumented
+from utils.eth import closest_block_before_timestamp, get_block_timestamps
+from utils.log_cache import get_logs_cached
 import json
 import os
 import time
@@ -13,52 +15,74 @@ def fetch_lock_break_data():
     """
     Fetches all lock break penalties between a specified block width and saves them to cache.
     Only includes penalties > 0 and aggregates multiple penalties for the same user.
+    Runs as a pipeline: fetch logs -> decode -> aggregate per user -> resolve timestamps -> write,
+    with every block timestamp it needs resolved in one batched lookup.
     """
-    end_block = closest_block_before_timestamp(Config.LOCK_BREAK_ELIGIBILITY_END_TIME)
-    timestamp = chain[end_block].timestamp
+    start_block = Config.LOCK_BREAK_START_BLOCK
+    with instrument.span('closest_block_before_timestamp'):
+        end_block = closest_block_before_timestamp(Config.LOCK_BREAK_ELIGIBILITY_END_TIME)
+    print(f'Fetching locks withdrawn between blocks {start_block:,} --> {end_block:,}')
 
-    print(f'Fetching locks withdrawn between blocks {Config.LOCK_BREAK_START_BLOCK:,} --> {end_block:,}')
-    from_time = chain[Config.LOCK_BREAK_START_BLOCK].timestamp
-    to_time = chain[end_block].timestamp
-    print(f'From {time.strftime("%m/%d %H:%M", time.gmtime(from_time))} to {time.strftime("%m/%d %H:%M", time.gmtime(to_time))}')
-    logs = LOCKER.events.LocksWithdrawn().get_logs(
-        fromBlock=Config.LOCK_BREAK_START_BLOCK, 
-        toBlock=end_block
-    )
+    with instrument.span('fetch_logs'):
+        logs = get_logs_cached(LOCKER, 'LocksWithdrawn', start_block, end_block)
     print(f'Found {len(logs)} withdrawn locks')
+    with instrument.span('aggregate_penalties'):
+        aggregated = aggregate_penalties(decode_penalties(logs))
+
+    with instrument.span('get_block_timestamps'):
+        timestamps = get_block_timestamps([start_block, end_block] + [user['block'] for user in aggregated.values()])
+    from_time, to_time = timestamps[start_block], timestamps[end_block]
+    print(f'From {time.strftime("%m/%d %H:%M", time.gmtime(from_time))} to {time.strftime("%m/%d %H:%M", time.gmtime(to_time))}')
+
+    penalty_data = {
+        user: {
+            'total_penalty': str(info['total_penalty']),
+            'timestamp': timestamps[info['block']],
+            'txn_hashes': info['txn_hashes'],
+        }
+        for user, info in aggregated.items()
+    }
+    total = sum(info['total_penalty'] for info in aggregated.values())
+    print(f'Total penalties: {total / 1e18}')
+    write_penalty_data(penalty_data, to_time)
+    return penalty_data
 
-    # Aggregate penalties by user
-    penalty_data = {}
+
+def decode_penalties(logs):
+    """Yields (user, penalty, block, txn hash) for each withdrawal that paid a penalty"""
     for log in logs:
-        user = web3.to_checksum_address(log.args['account'])  # Normalize address format
         penalty = log.args['penalty']
         if penalty > 0:
-            if user in penalty_data:
-                penalty += int(penalty_data[user]['total_penalty'])
-                txn_hashes = penalty_data[user]['txn_hashes'] + [log.transactionHash.hex()]
-            else:
-                txn_hashes = [log.transactionHash.hex()]
+            user = web3.to_checksum_address(log.args['account'])  # Normalize address format
+            yield user, penalty, log.blockNumber, log.transactionHash.hex()
 
-            penalty_data[user] = {
-                'total_penalty': str(penalty),
-                'timestamp': chain[log.blockNumber].timestamp,
-                'txn_hashes': txn_hashes
-            }
-    
-    total = sum(int(penalty_data[user]['total_penalty']) for user in penalty_data)
-    print(f'Total penalties: {total / 1e18}')
-    
+
+def aggregate_penalties(events):
+    """Sums penalties per user, keeping the block of their latest penalty and every txn hash in order"""
+    aggregated = {}
+    for user, penalty, block, txn_hash in events:
+        info = aggregated.get(user)
+        if info is None:
+            aggregated[user] = {'total_penalty': penalty, 'block': block, 'txn_hashes': [txn_hash]}
+        else:
+            info['total_penalty'] += penalty
+            info['block'] = block
+            info['txn_hashes'].append(txn_hash)
+    return aggregated
+
+
+def write_penalty_data(penalty_data, last_run):
     # Ensure cache directory exists
     os.makedirs(os.path.dirname(Config.PENALTY_DATA_FILE), exist_ok=True)
     
     # Write to cache file
     with open(Config.PENALTY_DATA_FILE, 'w') as f:
         json.dump({
-            'last_run': timestamp,
+            'last_run': last_run,
             'data': penalty_data
         }, f, indent=2, sort_keys=True)
-    
-    return penalty_data
 
+
+@instrumented('compute_lock_breaks')
 def main():
     return fetch_lock_break_data()
\ No newline at end of file
@@ -1,8 +1,14 @@
 import json
 import os
-from brownie import Contract, chain, ZERO_ADDRESS
+from brownie import Contract, chain
 import pandas as pd
-from utils.utils import func_timer
+from utils.utils import func_timer, from_wei
+from utils.instrument import instrumented
+from utils.multicall import Multicall, multicall
+from utils.async_rpc import AsyncRPC
+from utils.eth import get_block_timestamp, get_logs_chunked
+from utils.log_cache import get_logs_cached
+from utils.supply_tracker import SupplyTracker
 from config import Config, CirculatingSupplyData, ContractAddresses
 
 # Initialize contracts
@@ -15,7 +21,8 @@ FEE_RECEIVER = Contract(ContractAddresses.FEE_RECEIVER)
 
 
 @func_timer
-def get_fees():
+def get_lock_users(block):
+    """Returns every account that has created a lock, updating the on-disk cache up to `block`"""
     if os.path.exists(Config.USERS_LOCKS_FILE):
         with open(Config.USERS_LOCKS_FILE, 'r') as f:
             cache = json.load(f)
@@ -26,66 +33,72 @@ def get_fees():
         start_block = Config.DEPLOY_BLOCK
         users = set()
     
-    current_block = chain.height
-    
     # Only get new logs since last processed block
-    logs = LOCKER.events.LockCreated.get_logs(fromBlock=start_block, toBlock=current_block)
-    
-    # Add new users to existing set
-    for log in logs:
-        users.add(log.args['account'])
-    
-    # Calculate total fees for all known users
-    total = sum(VAULT.claimableBoostDelegationFees(u) / 1e18 for u in users)
+    if start_block <= block:
+        for log in get_logs_chunked(LOCKER, 'LockCreated', start_block, block):
+            users.add(log.args['account'])
     
-    # Save updated cache
-    cache = {
-        'last_block': current_block,
-        'users': list(users)  # Convert set to list for JSON serialization
-    }
-    with open(Config.USERS_LOCKS_FILE, 'w') as f:
-        json.dump(cache, f)
+        # Save updated cache
+        cache = {
+            'last_block': block,
+            'users': list(users)  # Convert set to list for JSON serialization
+        }
+        with open(Config.USERS_LOCKS_FILE, 'w') as f:
+            json.dump(cache, f)
     
-    return total
+    return sorted(users)
 
 
 @func_timer
-def sum_vault_approvals():
-    return sum([
-        PRISMA.allowance(VAULT, addr) 
-        for addr in [ContractAddresses.VESTING, ContractAddresses.TREASURY]
-    ]) / 1e18
+def get_receivers(block):
+    """
+    Returns the vault receivers registered at or before `block`, in id order. The index is built from
+    NewReceiverRegistered events and cached on disk, so each run only scans blocks it has not seen yet.
+    """
+    if os.path.exists(Config.RECEIVERS_FILE):
+        with open(Config.RECEIVERS_FILE, 'r') as f:
+            cache = json.load(f)
+    else:
+        os.makedirs(Config.CACHE_DIR, exist_ok=True)
+        cache = {'last_block': Config.DEPLOY_BLOCK - 1, 'receivers': []}
+
+    if cache['last_block'] < block:
+        for log in get_logs_chunked(VAULT, 'NewReceiverRegistered', cache['last_block'] + 1, block):
+            cache['receivers'].append({
+                'id': log.args['id'],
+                'account': log.args['receiver'],
+                'block': log.blockNumber,
+            })
+        cache['last_block'] = block
+        with open(Config.RECEIVERS_FILE, 'w') as f:
+            json.dump(cache, f)
+
+    # A receiver registered with several ids still has a single allocation
+    receivers = sorted(cache['receivers'], key=lambda r: r['id'])
+    return list(dict.fromkeys(r['account'] for r in receivers if r['block'] <= block))
 
 
 @func_timer
-def sum_receiver_allocations():
-    amount = 0
-    for i in range(1000):
-        receiver = VAULT.idToReceiver(i)
-        addr = receiver['account']
-        if addr == ZERO_ADDRESS:
-            break
-        amount += VAULT.allocated(addr)/1e18
-    return amount
+def sum_receiver_allocations(block):
+    return sum(multicall([(VAULT.allocated, addr) for addr in get_receivers(block)], block))
 
 
 @func_timer
-def vault_approvals():
+def vault_approvals(block=None):
+    block = chain.height if block is None else block
     accounts = ['Vesting', 'Team Treasury', 'Receivers']
+    vesting, treasury, vault_bal, max_total_supply = multicall([
+        (PRISMA.allowance, VAULT, ContractAddresses.VESTING),
+        (PRISMA.allowance, VAULT, ContractAddresses.TREASURY),
+        (PRISMA.balanceOf, VAULT),
+        (PRISMA.maxTotalSupply,),
+    ], block)
     amounts = [
-        PRISMA.allowance(VAULT, ContractAddresses.VESTING)/1e18,
-        PRISMA.allowance(VAULT, ContractAddresses.TREASURY)/1e18,
-        0  # Will accumulate receiver amounts
+        vesting,
+        treasury,
+        sum_receiver_allocations(block),
     ]
     
-    # Sum up all receiver allocations
-    for i in range(1000):
-        receiver = VAULT.idToReceiver(i)
-        addr = receiver['account']
-        if addr == ContractAddresses.ZERO_ADDRESS:
-            break
-        amounts[2] += VAULT.allocated(addr)/1e18
-    
     # Create DataFrame
     df = pd.DataFrame({
         '': accounts,
@@ -93,51 +106,104 @@ def vault_approvals():
     })
     
     # Format numbers before adding total
-    df['Unclaimed Allocation'] = df['Unclaimed Allocation'].apply(lambda x: f"{x:,.2f}")
+    df['Unclaimed Allocation'] = df['Unclaimed Allocation'].apply(lambda x: f"{from_wei(x):,.2f}")
     
     # Add total row with bold formatting
     total = sum(amounts)
     print(df.to_string(index=False))
-    print("\033[1m{:<20} {:>14}\033[0m".format('TOTAL', f"{total:,.2f}"))
+    print("\033[1m{:<20} {:>14}\033[0m".format('TOTAL', f"{from_wei(total):,.2f}"))
     
-    vault_bal = PRISMA.balanceOf(VAULT) / 1e18
-    max_total_supply = PRISMA.maxTotalSupply() / 1e18
     circulating_supply = max_total_supply - vault_bal + total
-    print(f'Circulating Supply: {circulating_supply:,.2f}')
+    print(f'Circulating Supply: {from_wei(circulating_supply):,.2f}')
     return total
 
 
 @func_timer
-def main():
-    fees = get_fees()
-    circulating = get_circulating_prisma(fees)
-    
-    supply_data = {
-        "timestamp": chain.time(),
-        "block_number": chain.height,
-        "metrics": {
-            "circulating_supply": {
-                "value": circulating,
-                "description": Config.SUPPLY_METRICS['Circulating PRISMA']
-            },
-            "non_circulating_supply": {
-                "value": get_non_circulating_prisma(circulating),
-                "description": Config.SUPPLY_METRICS['Non circulating PRISMA']
-            },
-            "liquid_locker_supply": {
-                "value": get_ll_supply(),
-                "description": Config.SUPPLY_METRICS['Liquid Locker Supply']
-            },
-            "locked_supply": {
-                "value": get_locked_prisma(),
-                "description": Config.SUPPLY_METRICS['Locked Supply']
-            },
-            "boost_delegation_fees": {
-                "value": fees,
-                "description": Config.SUPPLY_METRICS['Boost Delegation Fees']
-            }
-        }
+def collect_snapshot(block):
+    """
+    Reads every raw value the supply report needs at a single block. All contract reads go out in
+    one deduplicated multicall batch, and values are kept in wei so the report can be rebuilt from
+    the cached snapshot without any RPC calls.
+    """
+    users = get_lock_users(block)
+    receivers = get_receivers(block)
+
+    mc = Multicall(block, rpc=AsyncRPC())
+    reads = {
+        'total_supply': mc.add(PRISMA.totalSupply),
+        'vault_balance': mc.add(PRISMA.balanceOf, VAULT),
+        'fee_receiver_balance': mc.add(PRISMA.balanceOf, FEE_RECEIVER),
+        'locked_balance': mc.add(PRISMA.balanceOf, LOCKER),
+        'vesting_allowance': mc.add(PRISMA.allowance, VAULT, ContractAddresses.VESTING),
+        'treasury_allowance': mc.add(PRISMA.allowance, VAULT, ContractAddresses.TREASURY),
+        'yprisma_supply': mc.add(YPRISMA.totalSupply),
+        'cvxprisma_supply': mc.add(CVXPRISMA.totalSupply),
+        'burn_balances': [mc.add(PRISMA.balanceOf, x) for x in Config.BURN_ADDRESSES],
+        'receiver_allocations': [mc.add(VAULT.allocated, x) for x in receivers],
+        'boost_delegation_fees': [mc.add(VAULT.claimableBoostDelegationFees, u) for u in users],
+    }
+    print(f'Reading {len(mc.calls)} values at block {block:,}')
+    results = mc.execute()
+
+    values = {
+        name: sum(map(int, map(results.__getitem__, position))) if isinstance(position, list) else int(results[position])
+        for name, position in reads.items()
     }
+    values['eligible_lock_breaks'] = get_eligible_lock_breaks(block)
+    return {
+        'block_number': block,
+        'timestamp': get_block_timestamp(block),
+        'values': values,
+    }
+
+
+def load_snapshot(block):
+    """Returns the cached snapshot for a block, or None if it has not been collected yet"""
+    path = Config.get_supply_snapshot_file(block)
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def latest_snapshot(block):
+    """Returns the most recent cached snapshot taken at or before `block`, or None"""
+    if not os.path.isdir(Config.SUPPLY_SNAPSHOT_DIR):
+        return None
+    blocks = [int(name.split('.')[0]) for name in os.listdir(Config.SUPPLY_SNAPSHOT_DIR) if name.endswith('.json')]
+    blocks = [b for b in blocks if b <= block]
+    return load_snapshot(max(blocks)) if blocks else None
+
+
+def save_snapshot(snapshot):
+    """Caches a snapshot, unless its block is within Config.REORG_DEPTH of the head and may still be reorged"""
+    if snapshot['block_number'] > chain.height - Config.REORG_DEPTH:
+        print(f'Not caching snapshot for unfinalized block {snapshot["block_number"]:,}')
+        return False
+    path = Config.get_supply_snapshot_file(snapshot['block_number'])
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(snapshot, f, indent=2)
+    return True
+
+
+@instrumented('compute_supply')
+@func_timer
+def main(block=None):
+    """
+    Computes supply metrics with every read pinned to one block, the current head by default.
+    Raw reads are cached per block once it is Config.REORG_DEPTH below the head, so re-running for a
+    block already seen makes no RPC calls: `brownie run compute_supply main <block>`
+    """
+    block = chain.height if block is None else int(block)
+    snapshot = load_snapshot(block)
+    if snapshot is None:
+        snapshot = collect_snapshot(block)
+        save_snapshot(snapshot)
+    else:
+        print(f'Using cached snapshot for block {block:,}')
+
+    supply_data = render_supply_data(snapshot)
 
     os.makedirs(os.path.dirname(Config.SUPPLY_DATA_FILE), exist_ok=True)
     with open(Config.SUPPLY_DATA_FILE, 'w') as f:
@@ -148,58 +214,96 @@ def main():
 
 
 @func_timer
-def get_circulating_prisma(fees):
+def live(block=None):
+    """
+    Cheap circulating supply at a block, suitable for refreshing every block. Token balances come from
+    the Transfer event tracker and the vest allowances are read directly. Claimable fees and lock
+    breaks move slowly, so they are taken from the latest full snapshot. If none exists, one is collected
+    Config.REORG_DEPTH below the head so it can be cached.
+    """
+    block = chain.height if block is None else int(block)
+    snapshot = latest_snapshot(block)
+    if snapshot is None:
+        snapshot = collect_snapshot(min(block, chain.height - Config.REORG_DEPTH))
+        save_snapshot(snapshot)
+
+    vesting_allowance, treasury_allowance = multicall([
+        (PRISMA.allowance, VAULT, ContractAddresses.VESTING),
+        (PRISMA.allowance, VAULT, ContractAddresses.TREASURY),
+    ], block)
+    values = dict(
+        snapshot['values'],
+        vesting_allowance=int(vesting_allowance),
+        treasury_allowance=int(treasury_allowance),
+        **SupplyTracker().get_values(block),
+    )
+    print(f'Block {block:,} (fees and lock breaks from block {snapshot["block_number"]:,})')
+    return get_circulating_prisma(values)
+
+
+def render_supply_data(snapshot):
+    """Builds the supply report from a snapshot's raw values"""
+    values = snapshot['values']
+    circulating = get_circulating_prisma(values)
+    return {
+        "timestamp": snapshot['timestamp'],
+        "block_number": snapshot['block_number'],
+        "metrics": {
+            "circulating_supply": supply_metric(circulating, 'Circulating PRISMA'),
+            "non_circulating_supply": supply_metric(get_non_circulating_prisma(circulating, values), 'Non circulating PRISMA'),
+            "liquid_locker_supply": supply_metric(get_ll_supply(values), 'Liquid Locker Supply'),
+            "locked_supply": supply_metric(get_locked_prisma(values), 'Locked Supply'),
+            "boost_delegation_fees": supply_metric(values['boost_delegation_fees'], 'Boost Delegation Fees'),
+        }
+    }
+
+
+def supply_metric(value_wei, name):
+    """Reports a metric in tokens for display alongside its exact wei amount, kept as a string for JSON consumers"""
+    return {
+        "value": float(from_wei(value_wei)),
+        "value_wei": str(value_wei),
+        "description": Config.SUPPLY_METRICS[name]
+    }
+
+
+def get_circulating_prisma(values):
+    """Returns circulating PRISMA in wei from a snapshot's raw values"""
     supply_data = CirculatingSupplyData(
-        total_supply=PRISMA.totalSupply() / 1e18,
-        vault_balance=PRISMA.balanceOf(VAULT) / 1e18,
-        fee_receiver_balance=PRISMA.balanceOf(FEE_RECEIVER) / 1e18,
-        claimable_fees=fees,
-        unclaimed_vests=sum_vault_approvals(),
-        receiver_allocations=sum_receiver_allocations(),
-        burned=sum([PRISMA.balanceOf(x) for x in Config.BURN_ADDRESSES]) / 1e18,
-        eligible_lock_breaks=get_eligible_lock_breaks() / 1e18
+        total_supply=values['total_supply'],
+        vault_balance=values['vault_balance'],
+        fee_receiver_balance=values['fee_receiver_balance'],
+        claimable_fees=values['boost_delegation_fees'],
+        unclaimed_vests=values['vesting_allowance'] + values['treasury_allowance'],
+        receiver_allocations=values['receiver_allocations'],
+        burned=values['burn_balances'],
+        eligible_lock_breaks=values['eligible_lock_breaks']
     )
     
-    print(f"Total Supply: {supply_data.total_supply:,.2f}")
-    print(f"Vault Balance: {supply_data.vault_balance:,.2f}")
-    print(f"Burned: {supply_data.burned:,.2f}")
-    print(f"Fee Receiver Balance: {supply_data.fee_receiver_balance:,.2f}")
-    print(f"Claimable Fees: {supply_data.claimable_fees:,.2f}")
-    print(f"Unclaimed Vests: {supply_data.unclaimed_vests:,.2f}")
-    print(f"Receiver Allocations: {supply_data.receiver_allocations:,.2f}")
-    print(f"Eligible Lock Breaks: {supply_data.eligible_lock_breaks:,.2f}")
+    print(f"Total Supply: {from_wei(supply_data.total_supply):,.2f}")
+    print(f"Vault Balance: {from_wei(supply_data.vault_balance):,.2f}")
+    print(f"Burned: {from_wei(supply_data.burned):,.2f}")
+    print(f"Fee Receiver Balance: {from_wei(supply_data.fee_receiver_balance):,.2f}")
+    print(f"Claimable Fees: {from_wei(supply_data.claimable_fees):,.2f}")
+    print(f"Unclaimed Vests: {from_wei(supply_data.unclaimed_vests):,.2f}")
+    print(f"Receiver Allocations: {from_wei(supply_data.receiver_allocations):,.2f}")
+    print(f"Eligible Lock Breaks: {from_wei(supply_data.eligible_lock_breaks):,.2f}")
     
-    circulating = (
-        supply_data.total_supply -
-        supply_data.vault_balance -
-        supply_data.burned -
-        supply_data.fee_receiver_balance +
-        supply_data.eligible_lock_breaks +
-        supply_data.claimable_fees +
-        supply_data.unclaimed_vests
-    )
-    print(f"Circulating PRISMA: {circulating:,.2f}")
+    circulating = supply_data.circulating
+    print(f"Circulating PRISMA: {from_wei(circulating):,.2f}")
     return circulating
 
-def get_eligible_lock_breaks():
-    end_block = chain.height    # To be set 1 week after launch
+@func_timer
+def get_eligible_lock_breaks(end_block):    # To be set 1 week after launch
     print(f'Fetching all locks withdrawn between blocks {Config.LOCK_BREAK_START_BLOCK:,} --> {end_block:,}')
-    logs = LOCKER.events.LocksWithdrawn().get_logs(fromBlock=Config.LOCK_BREAK_START_BLOCK, toBlock=end_block)
-    return sum([log.args['penalty'] for log in logs])
+    logs = get_logs_cached(LOCKER, 'LocksWithdrawn', Config.LOCK_BREAK_START_BLOCK, end_block)
+    return sum(log.args['penalty'] for log in logs)
 
-def get_non_circulating_prisma(circulating):
-    return (
-        PRISMA.totalSupply() / 1e18 -
-        circulating
-    )
+def get_non_circulating_prisma(circulating, values):
+    return values['total_supply'] - circulating
 
-def get_locked_prisma():
-    return (
-        PRISMA.balanceOf(LOCKER)
-    ) / 1e18
+def get_locked_prisma(values):
+    return values['locked_balance']
 
-def get_ll_supply():
-    return (
-        YPRISMA.totalSupply() +
-        CVXPRISMA.totalSupply()
-    ) / 1e18
+def get_ll_supply(values):
+    return values['yprisma_supply'] + values['cvxprisma_supply']
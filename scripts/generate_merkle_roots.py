@@ -1,18 +1,23 @@
 import json
-from brownie import Contract, chain, web3
-from utils.merkle import create_merkle
+from brownie import Contract
+from concurrent.futures import ProcessPoolExecutor
+from utils.merkle import build_airdrop_merkle
 from config import Config, AllocationRatios, ContractAddresses
-import time
 
 ALLOCATIONS = {}
 
 def main():
     compute_allocations()
-    total_tokens = 0
-    total_tokens += create_team_merkle()
-    total_tokens += create_victims_merkle()
-    total_tokens += create_penalty_merkle()
-    print(f'\nTotal tokens allocated: {total_tokens}')
+    rates = prefetch_rates()
+    workers = min(Config.MERKLE_BUILD_WORKERS, len(Config.AIRDROPS))
+    if workers > 1:
+        results = build_concurrently(rates, workers)
+    else:
+        results = [
+            build_airdrop_merkle(airdrop, **get_build_args(airdrop, rates), print_allocations=True)
+            for airdrop in Config.AIRDROPS
+        ]
+    print_summary(results)
 
 
 def compute_allocations():
@@ -25,86 +30,54 @@ def compute_allocations():
     assert total_allocated == Config.INITIAL_SUPPLY, f"Allocation mismatch: {total_allocated} != {Config.INITIAL_SUPPLY}"
 
 
-def create_team_merkle():
-    """
-    Input data should be a JSON file containing team wallet addresses mapped to their assigned percentages.
-    The percentages should sum to 10000 (100%).
-    """
-    split_data = json.load(open(Config.TEAM_SPLITS_FILE))
-    assert sum(split_data.values()) == Config.BASIS_POINTS, f"Team split total mismatch: {total} != {Config.BASIS_POINTS}"
-    # Convert percentages to actual token amounts
-    tokens_per_wallet = {
-        wallet: (pct * ALLOCATIONS['TEAM']) // Config.BASIS_POINTS
-        for wallet, pct in split_data.items()
-    }
-    # Verify the total matches the team allocation
-    total = sum(tokens_per_wallet.values())
-    assert total == ALLOCATIONS['TEAM'], f"Team allocation mismatch: {total} != {ALLOCATIONS['TEAM']}"
-    print_allocation_results('TEAM', tokens_per_wallet, total)
-    create_merkle(tokens_per_wallet, total, 'team')
-    return sum(tokens_per_wallet.values())
-
-
-def create_victims_merkle():
-    """
-    Input data should be a JSON file containing victim wallet addresses mapped to their losses.
-    This function will assign amounts based on each victim's loss as a percentage of total losses.
-    """
-    victim_data = json.load(open(Config.VICTIM_DATA_FILE))
-    total_losses = sum(int(v['final_loss']) for v in victim_data.values())
-    tokens_per_wallet = {
-        k: int(v['final_loss']) * ALLOCATIONS['VICTIMS'] // total_losses # Assign amounts based on pct of total losses
-        for k, v in victim_data.items()
-        if int(v['final_loss']) > 0 # Ignore wallets that have already been made whole
-    }
-    # Verify the total matches the team allocation
-    total = sum(tokens_per_wallet.values())
-    if total < ALLOCATIONS['VICTIMS']:
-        diff = ALLOCATIONS['VICTIMS'] - total
-        assert diff < Config.DUST_THRESHOLD, f"Difference is greater than dust threshold: {diff}"
-        # Sort wallets by value and add diff to the smallest one
-        sorted_wallets = sorted(tokens_per_wallet.keys(), key=lambda x: tokens_per_wallet[x], reverse=True) # Sort wallets by value high to low
-        tokens_per_wallet[sorted_wallets[-1]] += diff
-        total = sum(tokens_per_wallet.values()) # Recalculate total
-    assert total == ALLOCATIONS['VICTIMS'], f"Victim allocation mismatch: {total} != {ALLOCATIONS['VICTIMS']}"
-    print_allocation_results('VICTIMS', tokens_per_wallet, total)
-    create_merkle(tokens_per_wallet, total, 'victims')
-    return sum(tokens_per_wallet.values())
-
-
-def create_penalty_merkle():
-    """
-    Input data should be a JSON file containing wallet addresses mapped to their total penalties.
-    Penalties are reimbursed at RSUP:PRISMA redemption rate.
-    """
+def get_redemption_rate():
+    """Penalties are reimbursed at the RSUP:PRISMA redemption rate"""
     redemption_rate = Contract(ContractAddresses.VEST_MANAGER).redemptionRatio()
     print(f'Redemption rate: {redemption_rate / 10**18:.18f}')
-    
-    user_amount_data = json.load(open(Config.PENALTY_DATA_FILE))
-    last_run = user_amount_data['last_run']
-    assert last_run + 12 > Config.LOCK_BREAK_ELIGIBILITY_END_TIME, f"Last run not after window closed"
-    print(f'\n Penalty data last calculated: {time.strftime("%B %d %H:%M", time.gmtime(last_run))} ...')
-    
-    tokens_per_wallet = {
-        wallet: (int(info['total_penalty']) * redemption_rate) // 10**18
-        for wallet, info in user_amount_data['data'].items()
-        if int(info['total_penalty']) > 0  # Ignore wallets that have no penalties
-    }
-    
-    total = sum(tokens_per_wallet.values())
     assert redemption_rate > 0
     assert redemption_rate < 10**17 # 0.1 rate
-    assert total < ALLOCATIONS['REDEMPTIONS'] * .10 # Sanity check
-    print_allocation_results('PENALTIES', tokens_per_wallet, total)
-    create_merkle(tokens_per_wallet, total, 'penalty')
-    return sum(tokens_per_wallet.values())
+    return redemption_rate
+
+
+# Rates that AirdropConfig entries can convert their weights at
+RATES = {
+    'redemption': get_redemption_rate,
+}
+
+
+def prefetch_rates():
+    """Reads every rate used by Config.AIRDROPS up front, so tree builds need no chain access"""
+    return {name: RATES[name]() for name in dict.fromkeys(a.rate for a in Config.AIRDROPS if a.rate)}
+
+
+def get_build_args(airdrop, rates):
+    """Resolves an airdrop's total, rate and cap for utils.allocation.allocate_airdrop"""
+    cap = None
+    if airdrop.cap is not None:
+        allocation, bps = airdrop.cap
+        cap = ALLOCATIONS[allocation] * bps // Config.BASIS_POINTS
+    return {
+        'total': ALLOCATIONS[airdrop.allocation] if airdrop.allocation else None,
+        'rate': rates[airdrop.rate] if airdrop.rate else None,
+        'cap': cap,
+    }
+
+
+def build_concurrently(rates, workers):
+    """Builds every airdrop tree in its own worker process, each hashing and writing its file in parallel"""
+    with ProcessPoolExecutor(workers) as pool:
+        futures = [
+            pool.submit(build_airdrop_merkle, airdrop, **get_build_args(airdrop, rates))
+            for airdrop in Config.AIRDROPS
+        ]
+        return [future.result() for future in futures]
 
 
-def print_allocation_results(alloc_type, data, alloc_total):
-    print(f'\n --- {alloc_type} allocations ---')
-    for wallet, amount in sorted(data.items(), key=lambda x: x[1], reverse=True):
-        print(f'{wallet}: {amount}')
-    print(f'Total: {alloc_total}\n')
+def print_summary(results):
+    print(f'\n --- Merkle roots ---')
+    for result in results:
+        print(f"{result['name']:<10} {result['merkle_root']}  total: {result['token_total']}  claims: {result['num_claims']}")
+    print(f"\nTotal tokens allocated: {sum(result['token_total'] for result in results)}")
 
 
 def get_circulating_supply() -> int:
@@ -112,8 +85,11 @@ def get_circulating_supply() -> int:
     try:
         with open(Config.SUPPLY_DATA_FILE, 'r') as f:
             supply_data = json.load(f)
-        # Convert from float to integer (wei)
-        return int(supply_data['metrics']['circulating_supply']['value'] * 10 ** 18)
+        metric = supply_data['metrics']['circulating_supply']
+        if 'value_wei' in metric:
+            return int(metric['value_wei'])
+        # Older supply data only has the float token amount
+        return int(metric['value'] * 10 ** 18)
     except (FileNotFoundError, KeyError, json.JSONDecodeError) as e:
         print(f"Error reading circulating supply: {e}")
         raise e
\ No newline at end of file
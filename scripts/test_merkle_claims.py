@@ -1,7 +1,9 @@
 from brownie import interface, accounts, web3
-import json
 import time
-from config import AirdropType, ContractAddresses
+from config import AirdropType, Config, ContractAddresses
+from utils.merkle_io import load_merkle_data
+from utils.claim_status import ClaimScanner
+from utils.multicall import Multicall
 
 airdrop_types = [AirdropType.TEAM, AirdropType.VICTIMS, AirdropType.PENALTY]
 vest_manager = interface.IVestManager(ContractAddresses.VEST_MANAGER)
@@ -42,36 +44,92 @@ def claim_one(airdrop_type: AirdropType) -> None:
         {'from': user, 'allow_revert': True, 'gas_limit': 5_000_000}
     )
     
-    time.sleep(2)
+    tx.wait(1)
     vest_data_after = vest_manager.getAggregateVestData(user)
     assert vest_data_after['_totalAmount'] == vest_data_before['_totalAmount'] + amount
 
 
+def claim_all(airdrop_type: AirdropType = AirdropType.PENALTY, batch_size=None):
+    """
+    Simulates every pending claim of an airdrop on a local fork or dev chain. Claims are sent in
+    batches without waiting on confirmations, then each batch waits on its receipts. Vest totals
+    are read for the whole batch in one multicall before and after. Returns the failed claims.
+    `brownie run test_merkle_claims claim_all 6 --network mainnet-fork`
+    """
+    airdrop_type = AirdropType(int(airdrop_type))
+    batch_size = batch_size or Config.CLAIM_BATCH_SIZE
+    pending = list(ClaimScanner(vest_manager, airdrop_type).scan())
+    funder = accounts[0]
+    failures = []
+    claimed = 0
+    start = time.perf_counter()
+
+    for i in range(0, len(pending), batch_size):
+        batch = pending[i:i + batch_size]
+        before = get_vest_totals([claim['address'] for claim in batch])
+
+        senders = [accounts.at(claim['address'], force=True) for claim in batch]
+        funding = [
+            funder.transfer(sender, '1 ether', required_confs=0)
+            for sender in senders if sender.balance() < 10**17
+        ]
+        for tx in funding:
+            tx.wait(1)
+
+        txs = [
+            vest_manager.merkleClaim(
+                sender,
+                sender,
+                claim['amount'],
+                airdrop_type,
+                claim['proof'],
+                claim['index'],
+                {'from': sender, 'allow_revert': True, 'gas_limit': 5_000_000, 'required_confs': 0}
+            )
+            for sender, claim in zip(senders, batch)
+        ]
+        for tx in txs:
+            tx.wait(1)
+
+        after = get_vest_totals([claim['address'] for claim in batch])
+        for claim, tx, total_before, total_after in zip(batch, txs, before, after):
+            if tx.status != 1:
+                failures.append({**claim, 'error': tx.revert_msg})
+            elif total_after != total_before + claim['amount']:
+                failures.append({**claim, 'error': f'vest total {total_before} -> {total_after}'})
+            else:
+                claimed += 1
+
+        elapsed = time.perf_counter() - start
+        print(f'{claimed + len(failures)}/{len(pending)} claims sent, {claimed / elapsed:,.1f} claims/sec')
+
+    elapsed = time.perf_counter() - start
+    print(f'{airdrop_type.name}: {claimed} claimed, {len(failures)} failed in {elapsed:,.1f}s')
+    for failure in failures:
+        print(f"Failed claim for {failure['address']} (index {failure['index']}): {failure['error']}")
+    return failures
+
+
+def get_vest_totals(users):
+    """Reads every user's aggregate vest total in one multicall"""
+    mc = Multicall()
+    for user in users:
+        mc.add(vest_manager.getAggregateVestData, user)
+    return [vest_data['_totalAmount'] for vest_data in mc.execute()]
+
+
 def get_next_user_data(type: AirdropType):
-    merkle_file = AirdropType.get_merkle_file(type)
-    with open(merkle_file, 'r') as f:
-        data = json.load(f)
-
-    allocations = []
-    for address, info in data['claims'].items():
-        allocations.append({
-            'address': address,
-            'amount': int(info['amount']),
-            'index': info['index'],
-            'proof': info['proof']  # Keep merkle proof in case needed
-        })
-    
-    # Sort by allocation amount in descending order
-    sorted_allocations = sorted(allocations, key=lambda x: x['amount'], reverse=True)
-    for i in range(len(sorted_allocations)):
-        if not vest_manager.hasClaimed(sorted_allocations[i]['address'], type):
-            return sorted_allocations[i]
-    return None
+    pending = ClaimScanner(vest_manager, type).scan()
+    return pending[0] if pending else None
+
+
+def claim_status():
+    """Prints claim progress for every airdrop type"""
+    return {airdrop_type.name: len(ClaimScanner(vest_manager, airdrop_type).scan()) for airdrop_type in airdrop_types}
+
 
 def commit_penalty_merkle_root():
-    merkle_file = AirdropType.get_merkle_file(AirdropType.PENALTY)
-    with open(merkle_file, 'r') as f:
-        data = json.load(f)
+    data = load_merkle_data(AirdropType.get_merkle_file(AirdropType.PENALTY))
     merkle_root = data['merkle_root']
     owner = vest_manager.owner()
     allocation = int(data['token_total'])
@@ -0,0 +1,52 @@
+import os
+import sys
+import time
+from config import AirdropType
+from utils.merkle import verify_claims
+from utils.merkle_io import load_merkle_data
+
+
+def verify_merkle_file(path, workers=None):
+    """
+    Checks a merkle claim file offline: every proof must lead to the merkle root, claim indexes
+    must be unique and the amounts must add up to the token total. Returns the list of problems found.
+    """
+    start = time.perf_counter()
+    data = load_merkle_data(path)
+    claims = list(data['claims'].items())
+    problems = [f'Invalid proof for {address}' for address in verify_claims(claims, data['merkle_root'], workers)]
+
+    indexes = {claim['index'] for _, claim in claims}
+    if len(indexes) != len(claims):
+        problems.append(f'{len(claims) - len(indexes)} duplicate claim indexes')
+    try:
+        total = sum(int(claim['amount']) for _, claim in claims)
+    except (KeyError, TypeError, ValueError):
+        problems.append('Claim amounts are not all integers')
+    else:
+        if total != int(data['token_total']):
+            problems.append(f"Claims total {total} but token total is {data['token_total']}")
+
+    elapsed = time.perf_counter() - start
+    status = 'OK' if not problems else f'{len(problems)} problems'
+    print(f"{path}: {len(claims):,} claims, root {data['merkle_root']}, {status} in {elapsed:.2f}s")
+    for problem in problems[:20]:
+        print(f'  {problem}')
+    return problems
+
+
+def main(*paths, workers=None):
+    """
+    Verifies merkle claim files, by default those of every airdrop type. Needs no network, so it can run
+    as `brownie run verify_merkle` or directly in CI: `python -m scripts.verify_merkle [path ...]`
+    """
+    workers = workers or os.cpu_count()
+    paths = paths or [AirdropType.get_merkle_file(airdrop_type) for airdrop_type in AirdropType]
+    problems = 0
+    for path in paths:
+        problems += len(verify_merkle_file(path, workers))
+    return problems
+
+
+if __name__ == '__main__':
+    sys.exit(1 if main(*sys.argv[1:]) else 0)
@@ -0,0 +1,120 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import aiohttp
+import pytest
+from utils.async_rpc import AsyncRPC, RPCError
+
+
+class StubServer:
+    """
+    Local JSON-RPC endpoint answering eth_call with its calldata after a short delay. `script` maps
+    calldata to a list of failures returned before the call succeeds: an HTTP status or a JSON-RPC error code.
+    """
+
+    def __init__(self, script=None, delay=0.01):
+        self.script = script or {}
+        self.delay = delay
+        self.lock = threading.Lock()
+        self.requests = {}
+        self.in_flight = 0
+        self.max_in_flight = 0
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                request = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+                status, body = stub.respond(request)
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.endpoint_uri = f'http://127.0.0.1:{self.server.server_port}'
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def respond(self, request):
+        data = request['params'][0]['data']
+        with self.lock:
+            self.requests[data] = self.requests.get(data, 0) + 1
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            failures = self.script.get(data, [])
+            failure = failures.pop(0) if failures else None
+        time.sleep(self.delay)
+        with self.lock:
+            self.in_flight -= 1
+        if isinstance(failure, int) and failure >= 400:
+            return failure, {}
+        if failure is not None:
+            return 200, {'jsonrpc': '2.0', 'id': request['id'], 'error': {'code': failure, 'message': 'failed'}}
+        return 200, {'jsonrpc': '2.0', 'id': request['id'], 'result': data}
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def stub():
+    servers = []
+
+    def start(**kwargs):
+        servers.append(StubServer(**kwargs))
+        return servers[-1]
+    yield start
+    for server in servers:
+        server.close()
+
+
+def calls(n):
+    return [('0x' + '00' * 20, '0x' + i.to_bytes(4, 'big').hex()) for i in range(n)]
+
+
+def test_results_keep_call_order_under_concurrency_cap(stub):
+    server = stub()
+    rpc = AsyncRPC(server.endpoint_uri, concurrency=4, rate_limit=0, backoff=0)
+    results = rpc.call_many(calls(40), 1)
+    assert results == [bytes.fromhex(data[2:]) for _, data in calls(40)]
+    assert 1 < server.max_in_flight <= 4
+
+
+def test_retries_throttling_and_limit_errors(stub):
+    server = stub(script={'0x00000000': [429, -32005, 503]})
+    rpc = AsyncRPC(server.endpoint_uri, rate_limit=0, backoff=0)
+    assert rpc.call_many(calls(2), 'latest') == [bytes(4), bytes.fromhex('00000001')]
+    assert server.requests['0x00000000'] == 4
+
+
+def test_non_retryable_status_fails_immediately(stub):
+    server = stub(script={'0x00000000': [401]})
+    rpc = AsyncRPC(server.endpoint_uri, rate_limit=0, backoff=1)
+    start = time.perf_counter()
+    with pytest.raises(aiohttp.ClientResponseError) as error:
+        rpc.call_many(calls(1), 1)
+    assert error.value.status == 401
+    assert server.requests['0x00000000'] == 1
+    assert time.perf_counter() - start < 1
+
+
+def test_non_retryable_rpc_error_and_return_exceptions(stub):
+    server = stub(script={'0x00000001': [3]})
+    rpc = AsyncRPC(server.endpoint_uri, rate_limit=0, backoff=0)
+    results = rpc.call_many(calls(2), 1, return_exceptions=True)
+    assert results[0] == bytes(4)
+    assert isinstance(results[1], RPCError) and results[1].code == 3
+    assert server.requests['0x00000001'] == 1
+
+
+def test_gives_up_after_max_retries(stub):
+    server = stub(script={'0x00000000': [429] * 10})
+    rpc = AsyncRPC(server.endpoint_uri, rate_limit=0, max_retries=2, backoff=0)
+    with pytest.raises(aiohttp.ClientResponseError):
+        rpc.call_many(calls(1), 1)
+    assert server.requests['0x00000000'] == 3
@@ -0,0 +1,80 @@
+import pytest
+
+pytest.importorskip('brownie')
+
+from types import SimpleNamespace
+from config import Config
+from utils import eth
+
+
+class CappedEvent:
+    """Stands in for a web3 contract event. Rejects ranges matching too many logs and throttles the first requests"""
+
+    def __init__(self, blocks, cap, throttled=0, error='query returned more than 10000 results'):
+        self.blocks = blocks
+        self.cap = cap
+        self.throttled = throttled
+        self.error = error
+        self.requests = 0
+
+    def get_logs(self, fromBlock, toBlock, argument_filters=None):
+        self.requests += 1
+        if self.throttled:
+            self.throttled -= 1
+            raise ValueError({'code': 429, 'message': 'Your app has exceeded its compute units per second capacity'})
+        matched = [b for b in self.blocks if fromBlock <= b <= toBlock]
+        if len(matched) > self.cap:
+            raise ValueError({'code': -32005, 'message': self.error})
+        return [SimpleNamespace(blockNumber=b, logIndex=i) for i, b in enumerate(matched)]
+
+
+def get_logs(event, start_block, end_block, **kwargs):
+    contract = SimpleNamespace(events=SimpleNamespace(Transfer=event), address='0x' + '00' * 20)
+    return eth.get_logs_chunked(contract, 'Transfer', start_block, end_block, **kwargs)
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(Config, 'RPC_BACKOFF', 0)
+
+
+def test_splits_ranges_with_too_many_results():
+    blocks = list(range(1, 5_001, 2))
+    logs = get_logs(CappedEvent(blocks, cap=500), 1, 5_000, chunk_size=5_000, workers=2)
+    assert [log.blockNumber for log in logs] == blocks
+
+
+@pytest.mark.parametrize('error', ['Log response size exceeded', 'eth_getLogs is limited to a 10,000 block range'])
+def test_recognizes_provider_range_errors(error):
+    blocks = list(range(1, 1_001))
+    logs = get_logs(CappedEvent(blocks, cap=300, error=error), 1, 1_000, chunk_size=1_000, workers=1)
+    assert len(logs) == 1_000
+
+
+def test_splits_range_error_quoting_blocks_that_contain_429():
+    # Alchemy's range error, quoting a suggested range whose hex block numbers contain 429
+    error = (
+        'Log response size exceeded. You can make eth_getLogs requests with up to a 2K block range and no limit '
+        'on the response size, or you can request any block range with a cap of 10K logs in the response. Based '
+        'on your parameters, this block range should work: [0x1432a8b, 0x1434290]'
+    )
+    blocks = list(range(1, 1_001))
+    event = CappedEvent(blocks, cap=300, error=error)
+    logs = get_logs(event, 1, 1_000, chunk_size=1_000, workers=1)
+    assert len(logs) == 1_000
+    assert not eth._is_rate_limited(ValueError({'code': -32602, 'message': error}))
+
+
+def test_retries_throttled_range_without_splitting():
+    event = CappedEvent([5, 10], cap=100, throttled=2)
+    logs = get_logs(event, 1, 1_000, chunk_size=1_000, workers=1)
+    assert [log.blockNumber for log in logs] == [5, 10]
+    assert event.requests == 3
+
+
+def test_gives_up_after_max_retries(monkeypatch):
+    monkeypatch.setattr(Config, 'RPC_MAX_RETRIES', 2)
+    event = CappedEvent([5], cap=100, throttled=10)
+    with pytest.raises(ValueError, match='compute units'):
+        get_logs(event, 1, 1_000, chunk_size=1_000, workers=1)
+    assert event.requests == 3
@@ -0,0 +1,42 @@
+from web3 import Web3
+from web3.providers.base import BaseProvider
+from config import ContractAddresses
+from utils.instrument import Instrument
+
+
+class StubProvider(BaseProvider):
+    def make_request(self, method, params):
+        return {'jsonrpc': '2.0', 'id': 1, 'result': '0x' + '00' * 32 if method == 'eth_call' else '0x10'}
+
+    def is_connected(self, show_traceback=False):
+        return True
+
+
+def test_counts_web3_requests_made_after_provider_is_used():
+    w3 = Web3(StubProvider())
+    # The provider caches its request chain on first use, as brownie's does when contracts load
+    w3.eth.block_number
+    instrument = Instrument()
+    instrument.start(web3=w3)
+    w3.eth.block_number
+    w3.eth.block_number
+    w3.eth.call({'to': ContractAddresses.PRISMA, 'data': '0x18160ddd'})
+    instrument.stop()
+
+    rpc = instrument.summary()['rpc']
+    assert rpc['eth_blockNumber']['none']['requests'] == 2
+    assert rpc['eth_call']['PRISMA']['requests'] == 1
+
+    # Requests after the run are not counted
+    w3.eth.block_number
+    assert instrument.summary()['rpc']['eth_blockNumber']['none']['requests'] == 2
+
+
+def test_spans_nest():
+    instrument = Instrument()
+    instrument.active = True
+    with instrument.span('outer'):
+        with instrument.span('inner'):
+            pass
+    assert [span['name'] for span in instrument.spans] == ['outer']
+    assert [span['name'] for span in instrument.spans[0]['children']] == ['inner']
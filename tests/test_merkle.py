@@ -0,0 +1,78 @@
+import random
+import pytest
+from utils.hashing import get_keccak
+from utils.merkle import MerkleTree, encode_leaves, load_tree_cache, save_tree_cache, verify_claims, verify_proof
+
+pytest.importorskip('eth_hash')
+
+
+def random_elements(n, seed=0):
+    rng = random.Random(seed)
+    return [('0x' + rng.randbytes(20).hex(), i, rng.randrange(10 ** 24)) for i in range(n)]
+
+
+@pytest.mark.parametrize('n', [1, 2, 3, 7, 64, 1001])
+@pytest.mark.parametrize('compact', [False, True])
+def test_iter_proofs_match_single_proofs(n, compact):
+    elements = random_elements(n)
+    tree = MerkleTree(encode_leaves(elements), backend='eth_hash', workers=1, compact=compact)
+    proofs = list(tree.iter_proofs())
+    assert proofs == [tree.get_proof_at(pos) for pos in tree.leaf_positions]
+    assert tree.get_all_proofs() == proofs
+    root = '0x' + tree.root.hex()
+    keccak = get_keccak('eth_hash')
+    for (address, index, amount), proof in zip(elements, proofs):
+        assert verify_proof(address, index, amount, proof, root, keccak)
+
+
+@pytest.mark.parametrize('n', [1, 2, 5, 1001])
+@pytest.mark.parametrize('workers', [1, 2])
+def test_compact_tree_matches_list_tree(n, workers):
+    nodes = encode_leaves(random_elements(n))
+    # A repeated leaf shares one sorted position
+    nodes.append(nodes[0])
+    tree = MerkleTree(nodes, backend='eth_hash', workers=workers, compact=False)
+    compact = MerkleTree(nodes, backend='eth_hash', workers=workers, compact=True)
+    assert [list(layer) for layer in compact.layers] == tree.layers
+    assert list(compact.leaf_positions) == tree.leaf_positions
+    assert compact.get_proof(nodes[-1]) == tree.get_proof(nodes[-1])
+
+
+def test_incremental_compact_tree_matches_full_build(tmp_path):
+    elements = random_elements(100)
+    nodes = encode_leaves(elements)
+    path = str(tmp_path / 'tree.json')
+    save_tree_cache(path, nodes, MerkleTree(nodes, backend='eth_hash', workers=1, compact=True))
+    elements[3] = (elements[3][0], 3, elements[3][2] + 1)
+    nodes = encode_leaves(elements)
+    tree = MerkleTree(nodes, backend='eth_hash', workers=1, compact=True, previous=load_tree_cache(path))
+    full = MerkleTree(nodes, backend='eth_hash', workers=1, compact=False)
+    assert [list(layer) for layer in tree.layers] == full.layers
+    assert list(tree.leaf_positions) == full.leaf_positions
+
+
+@pytest.mark.parametrize('n', [1, 2, 3, 5, 7, 8, 9, 1001])
+@pytest.mark.parametrize('workers', [2, 3, 4])
+def test_parallel_tree_matches_serial_tree(n, workers):
+    nodes = encode_leaves(random_elements(n))
+    serial = MerkleTree(nodes, backend='eth_hash', workers=1, compact=False)
+    parallel = MerkleTree(nodes, backend='eth_hash', workers=workers, compact=False)
+    assert parallel.layers == serial.layers
+    assert parallel.leaf_positions == serial.leaf_positions
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_verify_claims_reports_malformed_claims(workers):
+    elements = random_elements(8)
+    tree = MerkleTree(encode_leaves(elements), backend='eth_hash', workers=1)
+    claims = [
+        (address, {'index': index, 'amount': str(amount), 'proof': proof})
+        for (address, index, amount), proof in zip(elements, tree.iter_proofs())
+    ]
+    claims[1] = ('0x1234', claims[1][1])
+    claims[2] = ('not an address', claims[2][1])
+    claims[3][1]['proof'] = claims[3][1]['proof'][:-1] + ['0xzz']
+    claims[4][1]['amount'] = '-1'
+    claims[5][1]['index'] = 'seven'
+    invalid = verify_claims(claims, '0x' + tree.root.hex(), workers, 'eth_hash')
+    assert invalid == [address for address, _ in claims[1:6]]
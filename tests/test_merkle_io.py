@@ -0,0 +1,50 @@
+import json
+import pytest
+from utils.merkle_io import ClaimWriter, ProofStore, ProofStoreWriter, load_merkle_data
+
+ROOT = '0x' + '11' * 32
+CLAIMS = [
+    ('0x' + '22' * 20, 0, 10 ** 18, ['0x' + '33' * 32]),
+    ('0x' + '44' * 20, 1, 5, ['0x' + '55' * 32]),
+]
+
+
+@pytest.mark.parametrize('fmt', ['json', 'compact', 'ndjson'])
+def test_claim_writer_round_trip(tmp_path, fmt):
+    path = str(tmp_path / f'merkle.{fmt}')
+    with ClaimWriter(path, ROOT, 10 ** 18 + 5, fmt) as writer:
+        for claim in CLAIMS:
+            writer.write(*claim)
+    data = load_merkle_data(path)
+    assert data['merkle_root'] == ROOT
+    assert data['claims'][CLAIMS[1][0]] == {'index': 1, 'amount': '5', 'proof': CLAIMS[1][3]}
+    if fmt == 'json':
+        with open(path) as f:
+            assert f.read() == json.dumps(data, indent=4)
+
+
+def test_claim_writer_keeps_existing_file_on_error(tmp_path):
+    path = str(tmp_path / 'merkle.json')
+    with open(path, 'w') as f:
+        f.write('previous')
+    with pytest.raises(KeyboardInterrupt):
+        with ClaimWriter(path, ROOT, 1) as writer:
+            writer.write(*CLAIMS[0])
+            raise KeyboardInterrupt
+    with open(path) as f:
+        assert f.read() == 'previous'
+    assert [p.name for p in tmp_path.iterdir()] == ['merkle.json']
+
+
+def test_proof_store_writer_keeps_existing_file_on_error(tmp_path):
+    path = str(tmp_path / 'merkle.bin')
+    addresses = [claim[0] for claim in CLAIMS]
+    with ProofStoreWriter(path, ROOT, 10, addresses, 1) as writer:
+        writer.write(*CLAIMS[0])
+        writer.write(*CLAIMS[1])
+    with pytest.raises(RuntimeError):
+        with ProofStoreWriter(path, '0x' + '99' * 32, 10, addresses, 1) as writer:
+            raise RuntimeError
+    with ProofStore(path) as store:
+        assert store.merkle_root == ROOT
+        assert len(store) == 2
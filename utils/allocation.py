@@ -0,0 +1,113 @@
+import json
+import time
+from config import Config
+
+# How the dust left by flooring pro-rata shares is assigned:
+#   smallest          - all of it to the holder with the smallest share
+#   largest_remainder - one wei each to the holders with the largest rounding remainders
+DUST_POLICIES = ('smallest', 'largest_remainder')
+
+
+def apportion(weights, total, policy='smallest'):
+    """
+    Splits total pro rata over a dict of integer weights with exact integer math, in a single pass.
+    Returns the shares, which always sum to total, and a dict of the dust assigned to each holder.
+    """
+    if policy not in DUST_POLICIES:
+        raise ValueError(f'Unknown dust policy {policy}, expected one of {DUST_POLICIES}')
+    weight_total = sum(weights.values())
+    assert weight_total > 0, 'Cannot apportion over zero total weight'
+
+    shares = {}
+    remainders = []
+    allocated = 0
+    smallest, smallest_share = None, None
+    for holder, weight in weights.items():
+        share, remainder = divmod(weight * total, weight_total)
+        shares[holder] = share
+        allocated += share
+        if policy == 'largest_remainder':
+            remainders.append(remainder)
+        # Ties go to the holder listed last, the last entry when sorted by share high to low
+        elif smallest is None or share <= smallest_share:
+            smallest, smallest_share = holder, share
+
+    dust = total - allocated
+    assert 0 <= dust < len(weights), f'Unexpected dust: {dust}'
+    if dust == 0:
+        return shares, {}
+    if policy == 'smallest':
+        assigned = {smallest: dust}
+    else:
+        holders = list(shares)
+        ranked = sorted(range(len(holders)), key=remainders.__getitem__, reverse=True)
+        assigned = {holders[i]: 1 for i in ranked[:dust]}
+    for holder, amount in assigned.items():
+        shares[holder] += amount
+    return shares, assigned
+
+
+def scale(weights, rate, precision=10 ** 18):
+    """Converts each weight at a fixed point rate, flooring per holder. Shares sum to their own total, so there is no dust"""
+    return {holder: weight * rate // precision for holder, weight in weights.items()}
+
+
+def allocate(weights, total=None, rate=None, policy='smallest'):
+    """
+    Shared allocation engine for airdrops. Splits `total` pro rata over the weights (see apportion), or
+    converts every weight at a fixed point `rate` (see scale). Exactly one of the two must be given.
+    Returns the shares, the amount they sum to and the dust assigned to each holder.
+    """
+    if (total is None) == (rate is None):
+        raise ValueError('Expected exactly one of total or rate')
+    if rate is not None:
+        shares = scale(weights, rate)
+        return shares, sum(shares.values()), {}
+    shares, dust = apportion(weights, total, policy)
+    return shares, total, dust
+
+
+def load_weights(airdrop):
+    """
+    Reads the source file of an AirdropConfig. Returns the file contents and the integer weight of every
+    holder with a positive weight, e.g. victims that have already been made whole are left out.
+    """
+    with open(airdrop.source_file, 'r') as f:
+        data = json.load(f)
+    records = data[airdrop.records_key] if airdrop.records_key else data
+    weights = {}
+    for holder, record in records.items():
+        weight = int(record[airdrop.weight_key] if airdrop.weight_key else record)
+        if weight > 0:
+            weights[holder] = weight
+    return data, weights
+
+
+def allocate_airdrop(airdrop, total=None, rate=None, cap=None):
+    """
+    Loads and allocates one AirdropConfig, checking its source data and the result against the config.
+    `total`, `rate` and `cap` are resolved by the caller so this runs without any chain access.
+    Returns the shares and the amount they sum to.
+    """
+    data, weights = load_weights(airdrop)
+    if airdrop.fresh_after is not None:
+        last_run = data['last_run']
+        assert last_run + 12 > airdrop.fresh_after, f"Last run not after window closed"
+        print(f'\n {airdrop.name} data last calculated: {time.strftime("%B %d %H:%M", time.gmtime(last_run))} ...')
+    if airdrop.weight_total is not None:
+        weight_total = sum(weights.values())
+        assert weight_total == airdrop.weight_total, f"{airdrop.name} weight total mismatch: {weight_total} != {airdrop.weight_total}"
+
+    shares, total, dust = allocate(weights, total, rate, airdrop.dust_policy or Config.DUST_POLICY)
+    diff = sum(dust.values())
+    assert diff < airdrop.dust_threshold, f"Difference is greater than dust threshold: {diff}"
+    if cap is not None:
+        assert total < cap, f"{airdrop.name} total above its cap"
+    return shares, total
+
+
+def print_allocation_results(alloc_type, data, alloc_total):
+    print(f'\n --- {alloc_type} allocations ---')
+    for wallet, amount in sorted(data.items(), key=lambda x: x[1], reverse=True):
+        print(f'{wallet}: {amount}')
+    print(f'Total: {alloc_total}\n')
@@ -0,0 +1,111 @@
+import asyncio
+import itertools
+import random
+import time
+import aiohttp
+from config import Config
+from utils.instrument import get_target, instrument
+
+# JSON-RPC error codes worth retrying: limit exceeded and internal provider errors
+RETRYABLE_RPC_ERRORS = (-32005, -32603)
+RETRYABLE_HTTP_STATUS = (429, 500, 502, 503, 504)
+
+
+class RPCError(Exception):
+    def __init__(self, error):
+        super().__init__(error.get('message', error))
+        self.code = error.get('code')
+        self.data = error.get('data')
+
+
+class AsyncRPC:
+    """
+    Sends eth_calls concurrently against a JSON-RPC endpoint. At most `concurrency` requests are in
+    flight, requests are started no faster than `rate_limit` per second, and transport errors,
+    throttling responses and retryable provider errors are retried with exponential backoff.
+    Every call in a batch is pinned to the same block.
+    """
+
+    def __init__(self, endpoint_uri=None, concurrency=None, rate_limit=None, max_retries=None, backoff=None):
+        if endpoint_uri is None:
+            from brownie import web3
+            endpoint_uri = web3.provider.endpoint_uri
+        self.endpoint_uri = endpoint_uri
+        self.concurrency = concurrency or Config.RPC_CONCURRENCY
+        self.rate_limit = Config.RPC_RATE_LIMIT if rate_limit is None else rate_limit
+        self.max_retries = Config.RPC_MAX_RETRIES if max_retries is None else max_retries
+        self.backoff = Config.RPC_BACKOFF if backoff is None else backoff
+        self._ids = itertools.count()
+
+    def call_many(self, calls, block_identifier, return_exceptions=False):
+        """
+        Executes a list of (to, data) eth_calls at one block and returns the raw output bytes
+        in the same order. With return_exceptions, failed calls return their exception instead of raising.
+        """
+        return asyncio.run(self._call_many(calls, block_identifier, return_exceptions))
+
+    async def _call_many(self, calls, block_identifier, return_exceptions):
+        if isinstance(block_identifier, int):
+            block_identifier = hex(block_identifier)
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        self._rate_lock = asyncio.Lock()
+        self._next_slot = 0
+        timeout = aiohttp.ClientTimeout(total=Config.RPC_TIMEOUT)
+        async with aiohttp.ClientSession(timeout=timeout) as session:
+            results = await asyncio.gather(
+                *[self._eth_call(session, to, data, block_identifier) for to, data in calls],
+                return_exceptions=return_exceptions,
+            )
+        return results
+
+    async def _eth_call(self, session, to, data, block_identifier):
+        result = await self.request(session, 'eth_call', [{'to': to, 'data': data}, block_identifier])
+        return bytes.fromhex(result[2:])
+
+    async def request(self, session, method, params):
+        """Sends one JSON-RPC request, retrying with backoff, and returns its result"""
+        payload = {'jsonrpc': '2.0', 'id': next(self._ids), 'method': method, 'params': params}
+        target = get_target(method, params)
+        for attempt in itertools.count():
+            async with self._semaphore:
+                await self._throttle()
+                start = time.perf_counter()
+                failure = None
+                try:
+                    async with session.post(self.endpoint_uri, json=payload) as response:
+                        if response.status in RETRYABLE_HTTP_STATUS:
+                            raise aiohttp.ClientResponseError(
+                                response.request_info, response.history, status=response.status
+                            )
+                        if response.status >= 400:
+                            # Raised outside the retry handler below, other statuses won't succeed on retry
+                            failure = aiohttp.ClientResponseError(
+                                response.request_info, response.history, status=response.status, message=response.reason
+                            )
+                        else:
+                            body = await response.json(content_type=None)
+                except (aiohttp.ClientError, asyncio.TimeoutError):
+                    instrument.record_rpc(method, target, time.perf_counter() - start, error=True)
+                    if attempt >= self.max_retries:
+                        raise
+                else:
+                    if failure is not None:
+                        instrument.record_rpc(method, target, time.perf_counter() - start, error=True)
+                        raise failure
+                    instrument.record_rpc(method, target, time.perf_counter() - start, error='error' in body)
+                    if 'error' not in body:
+                        return body['result']
+                    if body['error'].get('code') not in RETRYABLE_RPC_ERRORS or attempt >= self.max_retries:
+                        raise RPCError(body['error'])
+            # Back off outside the semaphore so other requests can use the slot
+            await asyncio.sleep(self.backoff * 2 ** attempt * (1 + random.random()))
+
+    async def _throttle(self):
+        if not self.rate_limit:
+            return
+        loop = asyncio.get_running_loop()
+        async with self._rate_lock:
+            wait = self._next_slot - loop.time()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            self._next_slot = max(self._next_slot, loop.time()) + 1 / self.rate_limit
@@ -0,0 +1,85 @@
+import json
+import os
+from collections import deque
+from brownie import chain, web3
+from config import AirdropType, Config
+from utils.merkle_io import load_merkle_data
+from utils.multicall import Multicall
+
+
+class ClaimScanner:
+    """
+    Tracks which claims of an airdrop's merkle file have been made. The file is loaded once and
+    hasClaimed is read in multicall batches. A claim can't be undone, so claimed users are kept in a
+    cursor file on disk and only the remaining users are checked on each scan. The cursor is tied to
+    the merkle root, chain id and the hash of the block it was scanned at, and starts over when the
+    block is no longer on chain (e.g. a new fork session), when the root or chain changes, or when `reset` is set.
+    """
+
+    def __init__(self, vest_manager, airdrop_type: AirdropType, path=None, reset=False):
+        self.vest_manager = vest_manager
+        self.airdrop_type = airdrop_type
+        self.path = path or Config.get_claim_status_file(airdrop_type.name.lower())
+        data = load_merkle_data(AirdropType.get_merkle_file(airdrop_type))
+        self.merkle_root = data['merkle_root']
+        claims = [
+            {
+                'address': address,
+                'amount': int(info['amount']),
+                'index': info['index'],
+                'proof': info['proof'],
+            }
+            for address, info in data['claims'].items()
+        ]
+        # Largest allocations first
+        self.claims = sorted(claims, key=lambda x: x['amount'], reverse=True)
+        self.claimed = set() if reset else self.load()
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return set()
+        with open(self.path, 'r') as f:
+            cursor = json.load(f)
+        if cursor['merkle_root'] != self.merkle_root or cursor['chain_id'] != chain.id:
+            return set()
+        # A fork shares its chain id with mainnet and earlier forks, but not the hashes of its own blocks
+        if get_block_hash(cursor['block']) != cursor.get('block_hash'):
+            print(f'Claim status cursor block {cursor["block"]:,} is not on this chain, rescanning')
+            return set()
+        return set(cursor['claimed'])
+
+    def save(self, block):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path, 'w') as f:
+            json.dump({
+                'merkle_root': self.merkle_root,
+                'chain_id': chain.id,
+                'block': block,
+                'block_hash': get_block_hash(block),
+                'claimed': sorted(self.claimed),
+            }, f)
+
+    def scan(self, block=None):
+        """Checks every claim not yet known to be made and returns a queue of the pending ones, largest first"""
+        block = chain.height if block is None else block
+        unknown = [claim for claim in self.claims if claim['address'] not in self.claimed]
+        mc = Multicall(block)
+        for claim in unknown:
+            mc.add(self.vest_manager.hasClaimed, claim['address'], self.airdrop_type)
+        pending = deque()
+        for claim, has_claimed in zip(unknown, mc.execute()):
+            if has_claimed:
+                self.claimed.add(claim['address'])
+            else:
+                pending.append(claim)
+        self.save(block)
+        print(f'{self.airdrop_type.name}: {len(self.claimed)}/{len(self.claims)} claimed, {len(pending)} pending')
+        return pending
+
+
+def get_block_hash(block):
+    """Returns the hash of a block, or None if the chain doesn't have it"""
+    try:
+        return web3.eth.get_block(block)['hash'].hex()
+    except Exception:
+        return None
@@ -1,10 +1,73 @@
+import itertools
+import json
+import os
+import random
+import re
+import time
+import requests
 from brownie import web3
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 from datetime import datetime
+from config import Config
+from utils.instrument import instrument
+
+# Fragments of the errors providers return when a get_logs query matches too many logs or blocks
+LOGS_LIMIT_ERRORS = (
+    'query returned more than', 'response size', 'block range', 'blocks range', 'range is too large', 'too many logs',
+)
+# Throttling errors, retried with backoff rather than split. 429 is matched as a whole word so
+# hex block numbers quoted in a range error do not count as throttling
+RATE_LIMIT_ERRORS = re.compile(r'\b429\b|too many requests|rate limit|compute units|throughput|capacity')
+
+
+class BlockCache:
+    """
+    Persistent cache of block timestamps and contract creation blocks. Blocks within
+    Config.REORG_DEPTH of the chain head are not cached since they may still be reorged.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or Config.BLOCK_CACHE_FILE
+        self.timestamps = {}
+        self.creation_blocks = {}
+        self.loaded = False
+        self.safe_block = None
+
+    def load(self):
+        if self.loaded:
+            return
+        self.loaded = True
+        if os.path.exists(self.path):
+            with open(self.path, 'r') as f:
+                data = json.load(f)
+            self.timestamps = {int(block): ts for block, ts in data['timestamps'].items()}
+            self.creation_blocks = data['creation_blocks']
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path, 'w') as f:
+            json.dump({'timestamps': self.timestamps, 'creation_blocks': self.creation_blocks}, f)
+
+    def get_timestamps(self, blocks):
+        """Returns {block: timestamp}, fetching uncached blocks in batched JSON-RPC requests"""
+        self.load()
+        missing = sorted(set(blocks) - self.timestamps.keys())
+        if not missing:
+            return {block: self.timestamps[block] for block in blocks}
+        fetched = fetch_block_timestamps(missing)
+        if self.safe_block is None:
+            # The head only moves forward, so the first one seen stays a safe bound for this run
+            self.safe_block = web3.eth.block_number - Config.REORG_DEPTH
+        self.timestamps.update((block, ts) for block, ts in fetched.items() if block <= self.safe_block)
+        self.save()
+        return {block: self.timestamps.get(block, fetched.get(block)) for block in blocks}
+
+
+block_cache = BlockCache()
 
 
 def block_to_date(b):
-    time = web3.eth.get_block(b)['timestamp']
-    return datetime.fromtimestamp(time)
+    return datetime.fromtimestamp(get_block_timestamp(b))
 
 
 def closest_block_after_timestamp(timestamp: int) -> int:
@@ -16,23 +79,66 @@ def closest_block_before_timestamp(timestamp: int) -> int:
 
 
 def _closest_block_after_timestamp(timestamp: int) -> int:
+    """
+    Interpolation search for the first block with a timestamp after `timestamp`. Block times are
+    close to regular, so the guess from the timestamps at both ends of the range usually lands within
+    a few blocks. If a guess fails to halve the range, the next probe bisects to bound the worst case.
+    """
     height = web3.eth.block_number
     lo, hi = 0, height
+    ts_lo, ts_hi = get_block_timestamp(lo), get_block_timestamp(hi)
+    if ts_hi < timestamp:
+        raise Exception("timestamp is in the future")
 
-    while hi - lo > 1:
-        mid = lo + (hi - lo) // 2
-        if get_block_timestamp(mid) > timestamp:
-            hi = mid
+    bisect = False
+    while hi - lo > 1 and ts_hi > timestamp:
+        width = hi - lo
+        if bisect:
+            mid = lo + width // 2
         else:
-            lo = mid
-
-    if get_block_timestamp(hi) < timestamp:
-        raise Exception("timestamp is in the future")
+            mid = lo + (timestamp - ts_lo) * width // (ts_hi - ts_lo)
+            mid = min(max(mid, lo + 1), hi - 1)
+        ts_mid = get_block_timestamp(mid)
+        if ts_mid > timestamp:
+            hi, ts_hi = mid, ts_mid
+        else:
+            lo, ts_lo = mid, ts_mid
+        bisect = not bisect and hi - lo > width // 2
     return hi
 
 
 def get_block_timestamp(height):
-    return web3.eth.get_block(height)['timestamp']
+    return block_cache.get_timestamps([height])[height]
+
+
+def get_block_timestamps(heights):
+    """Returns {block: timestamp} for many blocks at once, see BlockCache.get_timestamps"""
+    return block_cache.get_timestamps(heights)
+
+
+def fetch_block_timestamps(heights):
+    """
+    Fetches block timestamps with batched JSON-RPC requests of Config.RPC_BATCH_SIZE blocks.
+    Falls back to one get_block call per block when the provider does not accept batches.
+    """
+    endpoint_uri = getattr(web3.provider, 'endpoint_uri', None)
+    timestamps = {}
+    for i in range(0, len(heights), Config.RPC_BATCH_SIZE):
+        batch = heights[i:i + Config.RPC_BATCH_SIZE]
+        try:
+            payload = [
+                {'jsonrpc': '2.0', 'id': block, 'method': 'eth_getBlockByNumber', 'params': [hex(block), False]}
+                for block in batch
+            ]
+            start = time.perf_counter()
+            response = requests.post(str(endpoint_uri), json=payload, timeout=Config.RPC_TIMEOUT)
+            instrument.record_rpc('eth_getBlockByNumber', seconds=time.perf_counter() - start, calls=len(batch))
+            response.raise_for_status()
+            results = {item['id']: item['result'] for item in response.json()}
+            timestamps.update((block, int(results[block]['timestamp'], 16)) for block in batch)
+        except Exception:
+            timestamps.update((block, web3.eth.get_block(block)['timestamp']) for block in batch)
+    return timestamps
 
 
 def timestamp_to_date_string(ts):
@@ -46,9 +152,13 @@ def timestamp_to_string(ts):
 
 def contract_creation_block(address):
     """
-    Find contract creation block using binary search.
+    Find contract creation block using binary search. Results are cached in the block cache.
     NOTE Requires access to historical state. Doesn't account for CREATE2 or SELFDESTRUCT.
     """
+    block_cache.load()
+    if address in block_cache.creation_blocks:
+        return block_cache.creation_blocks[address]
+
     lo = 0
     hi = end = web3.eth.block_number
 
@@ -59,23 +169,99 @@ def contract_creation_block(address):
             hi = mid
         else:
             lo = mid
-    return hi if hi != end else None
+    if hi == end:
+        return None
+    block_cache.creation_blocks[address] = hi
+    block_cache.save()
+    return hi
 
 
-def get_logs_chunked(contract, event_name, start_block=0, end_block=0, chunk_size=100_000):
+def get_logs_chunked(contract, event_name, start_block=0, end_block=0, chunk_size=None, workers=None, argument_filters=None):
+    """
+    Fetches the logs of an event over the inclusive block range [start_block, end_block], running up to
+    `workers` ranges concurrently. A range the provider rejects for returning too many results is split
+    in half and retried, and the window doubles while results are sparse. Logs are returned in chain order.
+    """
     try:
         event = getattr(contract.events, event_name)
     except Exception as e:
         print(f'Contract has no event by the name {event_name}', e)
+        raise
 
     if start_block == 0:
         start_block = contract_creation_block(contract.address)
     if end_block == 0:
         end_block = web3.eth.block_number
 
+    window = chunk_size or Config.LOGS_CHUNK_SIZE
+    workers = workers or Config.LOGS_WORKERS
     logs = []
-    while start_block < end_block:
-        logs += event.get_logs(fromBlock=start_block, toBlock=min(end_block, start_block + chunk_size))
-        start_block += chunk_size
+    cursor = start_block
+    pending = {}
+    with ThreadPoolExecutor(workers) as pool:
+        def submit(from_block, to_block):
+            future = pool.submit(_get_logs, event, from_block, to_block, argument_filters)
+            pending[future] = (from_block, to_block)
+
+        while cursor <= end_block or pending:
+            while cursor <= end_block and len(pending) < workers:
+                to_block = min(end_block, cursor + window - 1)
+                submit(cursor, to_block)
+                cursor = to_block + 1
+
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                from_block, to_block = pending.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    if from_block == to_block or not _is_too_many_results(e):
+                        raise
+                    mid = (from_block + to_block) // 2
+                    submit(from_block, mid)
+                    submit(mid + 1, to_block)
+                    window = max(1, (to_block - from_block + 1) // 2)
+                    continue
+                logs += result
+                if len(result) < Config.LOGS_SPARSE_THRESHOLD:
+                    window = min(window * 2, Config.LOGS_MAX_CHUNK_SIZE)
+
+    return sorted(logs, key=lambda log: (log.blockNumber, log.logIndex))
+
+
+def _get_logs(event, from_block, to_block, argument_filters=None):
+    """Fetches one range, retrying throttled requests with jittered exponential backoff"""
+    for attempt in itertools.count():
+        try:
+            if argument_filters:
+                return event.get_logs(fromBlock=from_block, toBlock=to_block, argument_filters=argument_filters)
+            return event.get_logs(fromBlock=from_block, toBlock=to_block)
+        except Exception as e:
+            if not _is_rate_limited(e) or attempt >= Config.RPC_MAX_RETRIES:
+                raise
+        time.sleep(Config.RPC_BACKOFF * 2 ** attempt * (1 + random.random()))
+
+
+def _is_too_many_results(error):
+    """Whether a get_logs error is a provider limit on the size of the result or block range"""
+    _, message = _error_details(error)
+    return any(hint in message for hint in LOGS_LIMIT_ERRORS)
+
+
+def _is_rate_limited(error):
+    """Whether a get_logs error is throttling, from its HTTP status or JSON-RPC code where there is one"""
+    if _is_too_many_results(error):
+        return False
+    code, message = _error_details(error)
+    return code == 429 or RATE_LIMIT_ERRORS.search(message) is not None
+
 
-    return logs
\ No newline at end of file
+def _error_details(error):
+    """Returns the HTTP status or JSON-RPC error code of a request error, if any, and its lowercased message"""
+    response = getattr(error, 'response', None)
+    if getattr(response, 'status_code', None) is not None:
+        return response.status_code, str(error).lower()
+    payload = error.args[0] if error.args else None
+    if isinstance(payload, dict):
+        return payload.get('code'), str(payload.get('message', '')).lower()
+    return None, str(error).lower()
@@ -0,0 +1,48 @@
+from eth_utils import remove_0x_prefix
+from config import Config
+
+# Selectable keccak256 implementations. All produce identical digests; `web3` routes every
+# call through brownie's web3 instance while the others call the hash library directly
+# and can be used without connecting to a network.
+HASH_BACKENDS = ('web3', 'eth_hash', 'pycryptodome')
+
+
+def get_keccak(backend=None):
+    """Returns a keccak256 function for the given backend, taking bytes and returning the 32 byte digest"""
+    backend = backend or Config.MERKLE_HASH_BACKEND
+    if backend == 'web3':
+        from brownie import web3
+        return web3.keccak
+    if backend == 'eth_hash':
+        from eth_hash.auto import keccak
+        return keccak
+    if backend == 'pycryptodome':
+        from Crypto.Hash import keccak as _keccak
+        new = _keccak.new
+        return lambda data: new(data=data, digest_bits=256).digest()
+    raise ValueError(f'Unknown hash backend {backend}, expected one of {HASH_BACKENDS}')
+
+
+def hash_leaves(elements, keccak):
+    """Hashes a list of hex encoded leaves"""
+    from_hex = bytes.fromhex
+    return [keccak(from_hex(remove_0x_prefix(el))) for el in elements]
+
+
+def hash_layer(layer, keccak):
+    """Hashes each sorted pair of a layer, carrying an odd trailing node up unchanged"""
+    next_layer = [keccak(a + b if a < b else b + a) for a, b in zip(layer[::2], layer[1::2])]
+    if len(layer) % 2:
+        next_layer.append(layer[-1])
+    return next_layer
+
+
+def hash_packed_layer(buffer, keccak):
+    """Like hash_layer, for a layer packed into one buffer of 32 byte nodes. Returns the next layer packed the same way"""
+    next_layer = bytearray()
+    end = len(buffer) - len(buffer) % 64
+    for start in range(0, end, 64):
+        a, b = buffer[start:start + 32], buffer[start + 32:start + 64]
+        next_layer += keccak(a + b if a < b else b + a)
+    next_layer += buffer[end:]
+    return bytes(next_layer)
@@ -0,0 +1,184 @@
+import cProfile
+import io
+import json
+import os
+import pstats
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+from config import Config, ContractAddresses
+
+# Number of functions listed in the summary when a run is profiled
+PROFILE_TOP = 30
+MIDDLEWARE_NAME = 'instrument'
+
+
+class Instrument:
+    """
+    Collects timings for one script run: every JSON-RPC request counted and timed by method and target
+    contract, nested spans timed with perf_counter, and optionally a cProfile of the whole run.
+    Requests sent through web3 are captured by a middleware added while a run is active, and the
+    batched and async clients report theirs through record_rpc.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.active = False
+        self.reset()
+
+    def reset(self):
+        self.rpc = {}
+        self.spans = []
+        self.started = None
+        self.profiler = None
+        self.provider = None
+
+    def start(self, profile=None, web3=None):
+        self.reset()
+        self.active = True
+        self.started = time.perf_counter()
+        self.patch_provider(web3)
+        if Config.PROFILE if profile is None else profile:
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+
+    def stop(self):
+        if self.profiler is not None:
+            self.profiler.disable()
+        self.unpatch_provider()
+        self.active = False
+
+    def patch_provider(self, web3=None):
+        """
+        Adds a middleware timing every request sent through web3. web3 caches its request chain on the
+        provider after the first request, so wrapping provider.make_request would not be picked up.
+        """
+        if web3 is None:
+            from brownie import web3
+        if web3.provider is None or MIDDLEWARE_NAME in web3.middleware_onion:
+            return
+
+        def middleware(make_request, w3):
+            def instrumented_request(method, params):
+                start = time.perf_counter()
+                error = True
+                try:
+                    response = make_request(method, params)
+                    error = isinstance(response, dict) and 'error' in response
+                    return response
+                finally:
+                    self.record_rpc(method, get_target(method, params), time.perf_counter() - start, error=error)
+            return instrumented_request
+
+        # The innermost layer, so only the provider round trip is timed
+        web3.middleware_onion.inject(middleware, name=MIDDLEWARE_NAME, layer=0)
+        self.provider = web3
+
+    def unpatch_provider(self):
+        if self.provider is not None:
+            self.provider.middleware_onion.remove(MIDDLEWARE_NAME)
+            self.provider = None
+
+    def record_rpc(self, method, target=None, seconds=0.0, calls=1, error=False):
+        """Records one request, which may carry several calls when batched"""
+        if not self.active:
+            return
+        with self.lock:
+            stats = self.rpc.setdefault(method, {}).setdefault(
+                contract_name(target), {'requests': 0, 'calls': 0, 'seconds': 0.0, 'errors': 0}
+            )
+            stats['requests'] += 1
+            stats['calls'] += calls
+            stats['seconds'] += seconds
+            stats['errors'] += bool(error)
+
+    @contextmanager
+    def span(self, name):
+        """Times a block of code, nested inside any span already open on this thread"""
+        if not self.active:
+            yield None
+            return
+        stack = getattr(self.local, 'stack', None)
+        if stack is None:
+            stack = self.local.stack = []
+        span = {'name': name, 'seconds': 0.0, 'children': []}
+        (stack[-1]['children'] if stack else self.spans).append(span)
+        stack.append(span)
+        start = time.perf_counter()
+        try:
+            yield span
+        finally:
+            span['seconds'] = time.perf_counter() - start
+            stack.pop()
+
+    def summary(self):
+        rpc_seconds = sum(stats['seconds'] for targets in self.rpc.values() for stats in targets.values())
+        summary = {
+            'wall_seconds': time.perf_counter() - self.started if self.started else 0.0,
+            'rpc_seconds': rpc_seconds,
+            'rpc_requests': sum(stats['requests'] for targets in self.rpc.values() for stats in targets.values()),
+            'rpc': self.rpc,
+            'spans': self.spans,
+        }
+        if self.profiler is not None:
+            stream = io.StringIO()
+            pstats.Stats(self.profiler, stream=stream).sort_stats('cumulative').print_stats(PROFILE_TOP)
+            summary['profile'] = stream.getvalue().splitlines()
+        return summary
+
+    def write(self, path):
+        summary = self.summary()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump(summary, f, indent=2)
+        print(f"Run took {summary['wall_seconds']:.2f}s, {summary['rpc_seconds']:.2f}s in "
+              f"{summary['rpc_requests']} RPC requests. Summary written to {path}")
+        return summary
+
+
+instrument = Instrument()
+
+
+def instrumented(script):
+    """Instruments a script entry point, writing its run summary to Config.get_run_summary_file(script)"""
+    def decorator(f):
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            instrument.start()
+            try:
+                with instrument.span(f.__name__):
+                    return f(*args, **kwargs)
+            finally:
+                instrument.stop()
+                instrument.write(Config.get_run_summary_file(script))
+        return wrapper
+    return decorator
+
+
+def get_target(method, params):
+    """Returns the contract address a request is aimed at, if any"""
+    if method in ('eth_call', 'eth_getLogs', 'eth_estimateGas') and params and isinstance(params[0], dict):
+        return params[0].get('to') or params[0].get('address')
+    if method in ('eth_getCode', 'eth_getBalance', 'eth_getStorageAt') and params:
+        return params[0]
+    return None
+
+
+_contract_names = None
+
+
+def contract_name(address):
+    """Names a known contract address after its ContractAddresses attribute"""
+    global _contract_names
+    if address is None:
+        return 'none'
+    if isinstance(address, (list, tuple)):
+        return ','.join(contract_name(a) for a in address)
+    if _contract_names is None:
+        _contract_names = {
+            value.lower(): name for name, value in vars(ContractAddresses).items()
+            if isinstance(value, str) and value.startswith('0x')
+        }
+    return _contract_names.get(str(address).lower(), str(address))
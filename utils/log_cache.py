@@ -0,0 +1,130 @@
+import json
+import os
+import sqlite3
+from collections.abc import Mapping
+from brownie import web3
+from hexbytes import HexBytes
+from web3.datastructures import AttributeDict
+from config import Config
+from utils.eth import get_logs_chunked
+
+
+class LogCache:
+    """
+    On-disk cache of decoded event logs, keyed by (contract address, event topic, block, log index).
+    Each query only fetches the parts of its block range not already covered. The last
+    Config.REORG_DEPTH blocks below the chain head are never marked as covered,
+    so they are fetched again on the next run in case of a reorg.
+    """
+
+    def __init__(self, path=None):
+        path = path or Config.LOG_CACHE_FILE
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.db = sqlite3.connect(path)
+        self.db.executescript('''
+            CREATE TABLE IF NOT EXISTS logs (
+                address TEXT, topic TEXT, block_number INTEGER, log_index INTEGER, log TEXT,
+                PRIMARY KEY (address, topic, block_number, log_index)
+            );
+            CREATE TABLE IF NOT EXISTS ranges (
+                address TEXT, topic TEXT, from_block INTEGER, to_block INTEGER
+            );
+        ''')
+
+    def get_logs(self, contract, event_name, start_block, end_block=0):
+        """Returns the logs of an event over the inclusive range [start_block, end_block], in chain order"""
+        head = web3.eth.block_number
+        end_block = end_block or head
+        key = (contract.address, contract.topics[event_name])
+        safe_block = head - Config.REORG_DEPTH
+
+        for from_block, to_block in self._missing_ranges(key, start_block, end_block):
+            logs = get_logs_chunked(contract, event_name, from_block, to_block)
+            with self.db:
+                self.db.execute(
+                    'DELETE FROM logs WHERE address = ? AND topic = ? AND block_number BETWEEN ? AND ?',
+                    (*key, from_block, to_block),
+                )
+                self.db.executemany(
+                    'INSERT INTO logs VALUES (?, ?, ?, ?, ?)',
+                    [(*key, log.blockNumber, log.logIndex, _serialize(log)) for log in logs],
+                )
+                if from_block <= min(to_block, safe_block):
+                    self._add_range(key, from_block, min(to_block, safe_block))
+
+        rows = self.db.execute(
+            'SELECT log FROM logs WHERE address = ? AND topic = ? AND block_number BETWEEN ? AND ? '
+            'ORDER BY block_number, log_index',
+            (*key, start_block, end_block),
+        )
+        return [_deserialize(row[0]) for row in rows]
+
+    def _missing_ranges(self, key, start_block, end_block):
+        missing = []
+        cursor = start_block
+        for from_block, to_block in self._ranges(key):
+            if to_block < cursor:
+                continue
+            if from_block > end_block:
+                break
+            if from_block > cursor:
+                missing.append((cursor, from_block - 1))
+            cursor = to_block + 1
+        if cursor <= end_block:
+            missing.append((cursor, end_block))
+        return missing
+
+    def _ranges(self, key):
+        return self.db.execute(
+            'SELECT from_block, to_block FROM ranges WHERE address = ? AND topic = ? ORDER BY from_block', key
+        ).fetchall()
+
+    def _add_range(self, key, from_block, to_block):
+        """Records a covered range, merging it with any adjacent or overlapping ranges"""
+        merged = []
+        for start, end in sorted(self._ranges(key) + [(from_block, to_block)]):
+            if merged and start <= merged[-1][1] + 1:
+                merged[-1][1] = max(merged[-1][1], end)
+            else:
+                merged.append([start, end])
+        self.db.execute('DELETE FROM ranges WHERE address = ? AND topic = ?', key)
+        self.db.executemany('INSERT INTO ranges VALUES (?, ?, ?, ?)', [(*key, start, end) for start, end in merged])
+
+    def close(self):
+        self.db.close()
+
+
+def get_logs_cached(contract, event_name, start_block, end_block=0):
+    cache = LogCache()
+    try:
+        return cache.get_logs(contract, event_name, start_block, end_block)
+    finally:
+        cache.close()
+
+
+def _serialize(log):
+    return json.dumps(_encode(log))
+
+
+def _deserialize(data):
+    return _decode(json.loads(data))
+
+
+def _encode(value):
+    if isinstance(value, bytes):
+        return {'hex': HexBytes(value).hex()}
+    if isinstance(value, Mapping):
+        return {k: _encode(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_encode(v) for v in value]
+    return value
+
+
+def _decode(value):
+    if isinstance(value, dict):
+        if value.keys() == {'hex'}:
+            return HexBytes(value['hex'])
+        return AttributeDict({k: _decode(v) for k, v in value.items()})
+    if isinstance(value, list):
+        return [_decode(v) for v in value]
+    return value
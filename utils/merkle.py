@@ -1,22 +1,102 @@
 import json
-from brownie import web3
-from itertools import zip_longest
-from eth_utils import encode_hex
-from eth_abi.packed import encode_packed
+from array import array
+from bisect import bisect_left
+from concurrent.futures import ProcessPoolExecutor
+from eth_utils import encode_hex, remove_0x_prefix, to_checksum_address
 from config import Config
+from utils.allocation import allocate_airdrop, apportion, print_allocation_results
+from utils.hashing import get_keccak, hash_leaves, hash_layer, hash_packed_layer
+from utils.merkle_io import ClaimWriter, ProofStoreWriter
+
+LEAF_TYPES = ["address", "uint", "uint"]
+NODE_SIZE = 32
+
+
+class CompactLayer:
+    """A tree layer held in one contiguous buffer of 32 byte nodes instead of a list of bytes objects"""
+    __slots__ = ('buffer', 'view')
+
+    def __init__(self, nodes):
+        self.buffer = b"".join(nodes)
+        self.view = memoryview(self.buffer)
+
+    @classmethod
+    def from_buffer(cls, buffer):
+        layer = cls.__new__(cls)
+        layer.buffer = buffer
+        layer.view = memoryview(buffer)
+        return layer
+
+    def __len__(self):
+        return len(self.buffer) // NODE_SIZE
+
+    def __getitem__(self, idx):
+        if idx < 0:
+            idx += len(self)
+        if not 0 <= idx < len(self):
+            raise IndexError('layer index out of range')
+        return self.view[idx * NODE_SIZE:(idx + 1) * NODE_SIZE].tobytes()
+
+    def __iter__(self):
+        view = self.view
+        for start in range(0, len(self.buffer), NODE_SIZE):
+            yield view[start:start + NODE_SIZE].tobytes()
+
 
 class MerkleTree:
-    def __init__(self, elements):
-        self.elements = sorted(set(web3.keccak(hexstr=el) for el in elements))
-        self.layers = MerkleTree.get_layers(self.elements)
+    def __init__(self, elements, backend=None, workers=None, compact=None, previous=None):
+        workers = workers or Config.MERKLE_WORKERS
+        compact = Config.MERKLE_COMPACT_LAYERS if compact is None else compact
+        self.keccak = get_keccak(backend)
+        if previous is not None:
+            # Reuse the leaves and layers of a previous build, see load_tree_cache
+            leaves = MerkleTree.get_leaves_cached(elements, previous, self.keccak)
+            self.elements = sorted(set(leaves))
+            self.layers = MerkleTree.get_layers_incremental(self.elements, previous['layers'], self.keccak)
+        elif workers > 1:
+            with ProcessPoolExecutor(workers) as pool:
+                leaves = map_chunked(pool, _hash_leaves_chunk, elements, workers, backend)
+                self.elements = sorted(set(leaves))
+                self.layers = MerkleTree.get_layers_parallel(self.elements, pool, workers, backend)
+        elif compact:
+            # Hashed straight into packed layers, the per-node lists are never built
+            self.layers, self.leaf_positions = MerkleTree.get_layers_compact(elements, self.keccak)
+        else:
+            leaves = hash_leaves(elements, self.keccak)
+            self.elements = sorted(set(leaves))
+            self.layers = MerkleTree.get_layers(self.elements, self.keccak)
+        if compact:
+            if not isinstance(self.layers[0], CompactLayer):
+                buffer, self.leaf_positions = MerkleTree.sort_leaves(leaves)
+                del leaves
+                self.layers = [CompactLayer.from_buffer(buffer)] + [CompactLayer(layer) for layer in self.layers[1:]]
+            # Single lookups use a binary search over the sorted leaf layer rather than a dict
+            self.elements = self.layers[0]
+            self.positions = None
+        else:
+            self.positions = {el: i for i, el in enumerate(self.elements)}
+            # Sorted position of each input element, in the order they were passed in
+            self.leaf_positions = [self.positions[leaf] for leaf in leaves]
 
     @property
     def root(self):
         return self.layers[-1][0]
 
+    def get_position(self, leaf):
+        """Returns the sorted position of a hashed leaf"""
+        if self.positions is not None:
+            return self.positions[leaf]
+        idx = bisect_left(self.elements, leaf)
+        if idx == len(self.elements) or self.elements[idx] != leaf:
+            raise KeyError(leaf)
+        return idx
+
     def get_proof(self, el):
-        el = web3.keccak(hexstr=el)
-        idx = self.elements.index(el)
+        el = hash_leaves([el], self.keccak)[0]
+        return self.get_proof_at(self.get_position(el))
+
+    def get_proof_at(self, idx):
+        """Returns the proof for the leaf at a sorted position"""
         proof = []
         for layer in self.layers:
             pair_idx = idx + 1 if idx % 2 == 0 else idx - 1
@@ -25,65 +105,290 @@ class MerkleTree:
             idx //= 2
         return proof
 
+    def get_hex_layers(self):
+        """Hex encodes every node below the root once, so proofs can share the encoded strings"""
+        hex_layers = []
+        for layer in self.layers[:-1]:
+            packed = (layer.buffer if isinstance(layer, CompactLayer) else b"".join(layer)).hex()
+            hex_layers.append(['0x' + packed[i:i + 2 * NODE_SIZE] for i in range(0, len(packed), 2 * NODE_SIZE)])
+        return hex_layers
+
+    def get_all_proofs(self):
+        """Returns the proof for every input element, in the order they were passed to the constructor"""
+        return list(self.iter_proofs())
+
+    def iter_proofs(self):
+        """Yields the proof for each input element in constructor order, without holding every proof in memory"""
+        hex_layers = self.get_hex_layers()
+        for pos in self.leaf_positions:
+            proof = []
+            for hex_layer in hex_layers:
+                if pos ^ 1 < len(hex_layer):
+                    proof.append(hex_layer[pos ^ 1])
+                pos >>= 1
+            yield proof
+
     @staticmethod
-    def get_layers(elements):
+    def get_layers(elements, keccak=None):
+        keccak = keccak or get_keccak()
         layers = [elements]
         while len(layers[-1]) > 1:
-            layers.append(MerkleTree.get_next_layer(layers[-1]))
+            layers.append(MerkleTree.get_next_layer(layers[-1], keccak))
+        return layers
+
+    @staticmethod
+    def get_layers_compact(elements, keccak):
+        """Builds every layer as a CompactLayer, returning the layers and the sorted position of each leaf"""
+        leaves = hash_leaves(elements, keccak)
+        buffer, leaf_positions = MerkleTree.sort_leaves(leaves)
+        del leaves
+        layers = [CompactLayer.from_buffer(buffer)]
+        while len(layers[-1]) > 1:
+            layers.append(CompactLayer.from_buffer(hash_packed_layer(layers[-1].buffer, keccak)))
+        return layers, leaf_positions
+
+    @staticmethod
+    def sort_leaves(leaves):
+        """
+        Packs the sorted, deduplicated leaves into one buffer. Also returns the sorted position of each
+        leaf in input order, taken from a sort of the leaf indexes so no lookup per leaf is needed.
+        """
+        leaf_positions = array('I', bytes(4 * len(leaves)))
+        buffer = bytearray()
+        previous = None
+        pos = -1
+        for i in sorted(range(len(leaves)), key=leaves.__getitem__):
+            leaf = leaves[i]
+            if leaf != previous:
+                buffer += leaf
+                previous = leaf
+                pos += 1
+            leaf_positions[i] = pos
+        return bytes(buffer), leaf_positions
+
+    @staticmethod
+    def get_leaves_cached(elements, previous, keccak):
+        """Hashes only the elements that were not part of the previous build"""
+        leaf_layer = previous['layers'][0]
+        cached = {el: leaf_layer[pos] for el, pos in zip(previous['elements'], previous['leaf_positions'])}
+        missing = [el for el in elements if el not in cached]
+        cached.update(zip(missing, hash_leaves(missing, keccak)))
+        return [cached[el] for el in elements]
+
+    @staticmethod
+    def get_layers_incremental(elements, previous_layers, keccak=None):
+        """
+        Rebuilds the layers from a previous build, rehashing only the paths above leaves that changed.
+        Falls back to a full build when the number of leaves changes. A changed leaf usually moves to
+        a new sorted position and shifts its neighbours, so the savings depend on how few leaves moved.
+        """
+        keccak = keccak or get_keccak()
+        if len(elements) != len(previous_layers[0]):
+            return MerkleTree.get_layers(elements, keccak)
+        layers = [elements]
+        dirty = {i for i, (new, old) in enumerate(zip(elements, previous_layers[0])) if new != old}
+        for previous_layer in previous_layers[1:]:
+            below = layers[-1]
+            layer = list(previous_layer)
+            dirty = {i // 2 for i in dirty}
+            for i in dirty:
+                pair = below[2 * i:2 * i + 2]
+                layer[i] = hash_layer(pair, keccak)[0]
+            layers.append(layer)
+        return layers
+
+    @staticmethod
+    def get_layers_parallel(elements, pool, workers, backend=None):
+        """
+        Splits the leaves into contiguous power-of-two sized chunks and hashes the subtree of each
+        chunk in the pool. Aligned chunks make every subtree layer a contiguous slice of the full
+        layer, so they are concatenated and only the top layers are hashed serially.
+        """
+        chunk_size = 1 << (-(-len(elements) // workers) - 1).bit_length()
+        depth = chunk_size.bit_length() - 1
+        chunks = [elements[i:i + chunk_size] for i in range(0, len(elements), chunk_size)]
+        layers = [[] for _ in range(depth + 1)]
+        for sub_layers in pool.map(_subtree_layers, chunks, [backend] * len(chunks)):
+            # A short trailing chunk reaches its root early, its node is carried up unchanged
+            sub_layers += [sub_layers[-1]] * (depth + 1 - len(sub_layers))
+            for layer, sub_layer in zip(layers, sub_layers):
+                layer += sub_layer
+        keccak = get_keccak(backend)
+        while len(layers[-1]) > 1:
+            layers.append(MerkleTree.get_next_layer(layers[-1], keccak))
         return layers
 
     @staticmethod
-    def get_next_layer(elements):
-        return [
-            MerkleTree.combined_hash(a, b) for a, b in zip_longest(elements[::2], elements[1::2])
-        ]
+    def get_next_layer(elements, keccak=None):
+        return hash_layer(elements, keccak or get_keccak())
 
     @staticmethod
-    def combined_hash(a, b):
+    def combined_hash(a, b, keccak=None):
         if a is None:
             return b
         if b is None:
             return a
-        return web3.keccak(b"".join(sorted([a, b])))
-    
-def create_merkle(user_amount_data, total_distribution, alloc_type):
-    # Convert values to integers and calculate ratio using integer division
-    total_amounts = sum(user_amount_data.values())
-    
-    # Calculate amounts using integer multiplication first, then division
-    user_amount_data = {
-        k.lower(): (v * total_distribution) // total_amounts 
-        for k, v in user_amount_data.items()
-    }
-    
-    addresses = sorted(user_amount_data, key=lambda k: user_amount_data[k], reverse=True)
-    while sum(user_amount_data.values()) < total_distribution:
-        diff = total_distribution - sum(user_amount_data.values())
-        user_amount_data[addresses[len(addresses) - 1]] += diff
-    assert sum(user_amount_data.values()) == total_distribution
+        return (keccak or get_keccak())(b"".join(sorted([a, b])))
     
+def map_chunked(pool, func, items, workers, *args):
+    """Applies func to contiguous chunks of items in the pool and concatenates the results in order"""
+    chunk_size = -(-len(items) // workers) or 1
+    chunks = [items[i:i + chunk_size] for i in range(0, len(items), chunk_size)]
+    results = pool.map(func, chunks, *[[arg] * len(chunks) for arg in args])
+    return [item for result in results for item in result]
+
+
+def pack_leaf(address, index, amount):
+    """Packs a claim as abi.encodePacked over LEAF_TYPES, without eth_abi's per-call type parsing"""
+    address = bytes.fromhex(remove_0x_prefix(address))
+    if len(address) != 20:
+        raise ValueError(f'Invalid claim address 0x{address.hex()}')
+    return address + int(index).to_bytes(32, 'big') + int(amount).to_bytes(32, 'big')
+
+
+def verify_proof(address, index, amount, proof, merkle_root, keccak=None, cache=None):
+    """
+    Checks one claim against a merkle root without a chain. The leaf is rebuilt with the same packed
+    encoding as create_merkle and folded up the proof with the sorted-pair hash of combined_hash.
+    Pairs above the second level are shared by many proofs, so their hashes can be memoized in `cache`.
+    """
+    keccak = keccak or get_keccak()
+    node = keccak(pack_leaf(address, index, amount))
+    for level, sibling in enumerate(proof):
+        sibling = bytes.fromhex(remove_0x_prefix(sibling))
+        pair = node + sibling if node < sibling else sibling + node
+        if cache is None or level < 2:
+            node = keccak(pair)
+            continue
+        node = cache.get(pair)
+        if node is None:
+            node = cache[pair] = keccak(pair)
+    return node == bytes.fromhex(remove_0x_prefix(merkle_root))
+
+
+def verify_claims(claims, merkle_root, workers=None, backend=None):
+    """
+    Verifies a list of (address, claim) pairs against a merkle root, spread over `workers` processes.
+    Returns the addresses whose proofs do not match or whose claims are malformed, in input order.
+    """
+    workers = workers or Config.MERKLE_WORKERS
+    if workers > 1 and len(claims) > workers:
+        with ProcessPoolExecutor(workers) as pool:
+            return map_chunked(pool, _verify_chunk, claims, workers, merkle_root, backend)
+    return _verify_chunk(claims, merkle_root, backend)
+
+
+def _verify_chunk(claims, merkle_root, backend):
+    keccak = get_keccak(backend)
+    cache = {}
+    invalid = []
+    for address, claim in claims:
+        try:
+            valid = verify_proof(address, claim['index'], claim['amount'], claim['proof'], merkle_root, keccak, cache)
+        except (KeyError, TypeError, ValueError, OverflowError):
+            # A malformed address, index, amount or proof node
+            valid = False
+        if not valid:
+            invalid.append(address)
+    return invalid
+
+
+def save_tree_cache(path, elements, tree):
+    """Persists the input elements and layers of a tree so a later build can be incremental"""
+    with open(path, 'w') as f:
+        json.dump({
+            'elements': elements,
+            'leaf_positions': list(tree.leaf_positions),
+            'layers': [(layer.buffer if isinstance(layer, CompactLayer) else b"".join(layer)).hex() for layer in tree.layers],
+        }, f)
+
+
+def load_tree_cache(path):
+    """Loads a tree saved with save_tree_cache, returning None when there is no previous build"""
+    try:
+        with open(path, 'r') as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return None
+    data['layers'] = [
+        [buffer[i:i + NODE_SIZE] for i in range(0, len(buffer), NODE_SIZE)]
+        for buffer in map(bytes.fromhex, data['layers'])
+    ]
+    return data
+
+
+def encode_leaves(elements):
+    return ['0x' + pack_leaf(*el).hex() for el in elements]
+
+
+def _hash_leaves_chunk(elements, backend):
+    return hash_leaves(elements, get_keccak(backend))
+
+
+def _subtree_layers(leaves, backend):
+    return MerkleTree.get_layers(leaves, get_keccak(backend))
+
+
+def create_merkle(
+    user_amount_data, total_distribution, alloc_type,
+    backend=None, workers=None, compact=None, fmt=None, incremental=None, dust_policy=None
+):
+    # Scale amounts to the total distribution with exact integer math
+    user_amount_data, dust = apportion(
+        {k.lower(): v for k, v in user_amount_data.items()},
+        total_distribution,
+        dust_policy or Config.DUST_POLICY,
+    )
+    if dust:
+        print(f'Assigned {sum(dust.values())} wei of rounding dust to {len(dust)} users')
+
+    # Claims are indexed by pro-rata share, before any dust was added
+    addresses = sorted(user_amount_data, key=lambda k: user_amount_data[k] - dust.get(k, 0), reverse=True)
     elements = [
         (account, index, user_amount_data[account]) for index, account in enumerate(addresses)
     ]
-    nodes = [encode_hex(encode_packed(["address", "uint", "uint"], el)) for el in elements]
-    tree = MerkleTree(nodes)
-
-    distribution = {
-        "merkle_root": encode_hex(tree.root),
-        "token_total": sum(user_amount_data.values()),
-        "claims": {
-            web3.to_checksum_address(user): {
-                "index": index,
-                "amount": str(amount),
-                "proof": tree.get_proof(nodes[index]),
-            }
-            for user, index, amount in elements
-        },
+    workers = workers or Config.MERKLE_WORKERS
+    if workers > 1:
+        with ProcessPoolExecutor(workers) as pool:
+            nodes = map_chunked(pool, encode_leaves, elements, workers)
+    else:
+        nodes = encode_leaves(elements)
+    incremental = Config.MERKLE_INCREMENTAL if incremental is None else incremental
+    if incremental:
+        cache_file = Config.get_merkle_tree_cache_file(alloc_type)
+        tree = MerkleTree(nodes, backend, workers, compact, previous=load_tree_cache(cache_file))
+        save_tree_cache(cache_file, nodes, tree)
+    else:
+        tree = MerkleTree(nodes, backend, workers, compact)
+    del nodes
+
+    # Stream claims to disk as their proofs are generated
+    fmt = fmt or Config.MERKLE_OUTPUT_FORMAT
+    merkle_root = encode_hex(tree.root)
+    merkle_file = Config.get_merkle_file(alloc_type, fmt)
+    if fmt == 'binary':
+        addresses = [user for user, _, _ in elements]
+        writer = ProofStoreWriter(merkle_file, merkle_root, total_distribution, addresses, len(tree.layers) - 1)
+    else:
+        writer = ClaimWriter(merkle_file, merkle_root, total_distribution, fmt)
+    with writer:
+        for (user, index, amount), proof in zip(elements, tree.iter_proofs()):
+            writer.write(to_checksum_address(user), index, amount, proof)
+    print(f'Distribution successfully written for {writer.count} users')
+    print(f"base merkle root: {merkle_root}")
+    return {
+        "merkle_root": merkle_root,
+        "token_total": total_distribution,
+        "num_claims": writer.count,
     }
 
-    # Write the distribution data to a JSON file
-    with open(Config.get_merkle_file(alloc_type), 'w') as json_file:
-        json.dump(distribution, json_file, indent=4)
-    print(f'Distribution successfully written for {len(distribution["claims"])} users')
-    print(f"base merkle root: {encode_hex(tree.root)}")
-    return distribution
\ No newline at end of file
+
+def build_airdrop_merkle(airdrop, total=None, rate=None, cap=None, print_allocations=False):
+    """
+    Allocates one AirdropConfig and writes its merkle file, see allocate_airdrop. Needs no chain
+    access, so generate_merkle_roots can run one per worker process.
+    """
+    shares, total = allocate_airdrop(airdrop, total, rate, cap)
+    if print_allocations:
+        print_allocation_results(airdrop.name.upper(), shares, total)
+    return dict(create_merkle(shares, total, airdrop.name), name=airdrop.name)
@@ -0,0 +1,227 @@
+import json
+import mmap
+import os
+import struct
+from array import array
+from eth_utils import to_checksum_address
+
+# Output formats for merkle claim files:
+#   json    - indented document, the original merkle_data_*.json layout
+#   compact - the same document without whitespace
+#   ndjson  - a header line with the root and total, then one claim per line
+#   binary  - fixed-width proof records sorted by address, see ProofStore
+MERKLE_FORMATS = ('json', 'compact', 'ndjson', 'binary')
+
+# Binary proof store layout: a header followed by one fixed-width record per claim, sorted by address.
+#   header: magic, version, proof depth, claim count, merkle root, token total (uint256)
+#   record: address, index, amount (uint256), proof length, proof nodes padded to the proof depth
+PROOF_STORE_MAGIC = b'RSPF'
+PROOF_STORE_VERSION = 1
+PROOF_STORE_HEADER = struct.Struct('>4sBBI32s32s')
+PROOF_RECORD_PREFIX = struct.Struct('>20sI32sB')
+
+
+class AtomicWriter:
+    """
+    Base for the merkle file writers. Output goes to a temporary file next to `path`, which only replaces
+    `path` once the writer is closed. If the block using the writer raises, the temporary file is
+    deleted and any existing file at `path` is left untouched.
+    """
+
+    def open(self, path, mode):
+        self.path = path
+        self.tmp_path = f'{path}.tmp'
+        self.file = open(self.tmp_path, mode)
+
+    def finish(self):
+        """Writes any trailer before the file is committed"""
+
+    def close(self):
+        self.finish()
+        self.file.close()
+        os.replace(self.tmp_path, self.path)
+
+    def abort(self):
+        self.file.close()
+        os.remove(self.tmp_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+class ClaimWriter(AtomicWriter):
+    """
+    Streams a merkle claim file to disk one claim at a time, so memory use does not grow
+    with the number of claims. The json format is byte-identical to json.dump(..., indent=4)
+    of the full distribution.
+    """
+
+    def __init__(self, path, merkle_root, token_total, fmt='json'):
+        if fmt not in MERKLE_FORMATS:
+            raise ValueError(f'Unknown merkle file format {fmt}, expected one of {MERKLE_FORMATS}')
+        self.fmt = fmt
+        self.count = 0
+        self.open(path, 'w')
+        if fmt == 'json':
+            self.file.write(
+                '{\n'
+                f'    "merkle_root": {json.dumps(merkle_root)},\n'
+                f'    "token_total": {json.dumps(token_total)},\n'
+                '    "claims": {'
+            )
+        elif fmt == 'compact':
+            self.file.write(f'{{"merkle_root":{json.dumps(merkle_root)},"token_total":{json.dumps(token_total)},"claims":{{')
+        else:
+            self.file.write(json.dumps({'merkle_root': merkle_root, 'token_total': token_total}, separators=(',', ':')) + '\n')
+
+    def write(self, address, index, amount, proof):
+        claim = {'index': index, 'amount': str(amount), 'proof': proof}
+        if self.fmt == 'json':
+            body = json.dumps(claim, indent=4).replace('\n', '\n        ')
+            self.file.write(f'{"," if self.count else ""}\n        {json.dumps(address)}: {body}')
+        elif self.fmt == 'compact':
+            self.file.write(f'{"," if self.count else ""}{json.dumps(address)}:{json.dumps(claim, separators=(",", ":"))}')
+        else:
+            self.file.write(json.dumps({'address': address, **claim}, separators=(',', ':')) + '\n')
+        self.count += 1
+
+    def finish(self):
+        if self.fmt == 'json':
+            self.file.write('\n    }\n}' if self.count else '}\n}')
+        elif self.fmt == 'compact':
+            self.file.write('}}')
+
+
+class ProofStoreWriter(AtomicWriter):
+    """
+    Writes the binary proof store. Records have a fixed width, so each claim is written
+    straight to its address-sorted slot as it is streamed in, in any order.
+    """
+
+    def __init__(self, path, merkle_root, token_total, addresses, depth):
+        self.depth = depth
+        self.record_size = PROOF_RECORD_PREFIX.size + 32 * depth
+        self.count = 0
+        # Slot of each claim index in the address-sorted record table
+        order = sorted(range(len(addresses)), key=lambda i: addresses[i].lower())
+        self.slots = array('I', bytes(4 * len(addresses)))
+        for slot, index in enumerate(order):
+            self.slots[index] = slot
+        self.open(path, 'wb')
+        self.file.write(PROOF_STORE_HEADER.pack(
+            PROOF_STORE_MAGIC,
+            PROOF_STORE_VERSION,
+            depth,
+            len(addresses),
+            bytes.fromhex(merkle_root[2:]),
+            token_total.to_bytes(32, 'big'),
+        ))
+        self.file.truncate(PROOF_STORE_HEADER.size + self.record_size * len(addresses))
+
+    def write(self, address, index, amount, proof):
+        record = PROOF_RECORD_PREFIX.pack(bytes.fromhex(address[2:]), index, amount.to_bytes(32, 'big'), len(proof))
+        record += b"".join(bytes.fromhex(node[2:]) for node in proof).ljust(32 * self.depth, b"\0")
+        self.file.seek(PROOF_STORE_HEADER.size + self.record_size * self.slots[index])
+        self.file.write(record)
+        self.count += 1
+
+
+class ProofStore:
+    """
+    Read-only view of a binary proof store. The file is memory mapped and claims are found by
+    binary search over the sorted address column, so lookups never parse the whole file.
+    """
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.depth, self.count, root, total = PROOF_STORE_HEADER.unpack_from(self.mm)
+        if magic != PROOF_STORE_MAGIC or version != PROOF_STORE_VERSION:
+            raise ValueError(f'{path} is not a version {PROOF_STORE_VERSION} proof store')
+        self.merkle_root = '0x' + root.hex()
+        self.token_total = int.from_bytes(total, 'big')
+        self.record_size = PROOF_RECORD_PREFIX.size + 32 * self.depth
+
+    def __len__(self):
+        return self.count
+
+    def __contains__(self, address):
+        return self._find(address) is not None
+
+    def _offset(self, slot):
+        return PROOF_STORE_HEADER.size + self.record_size * slot
+
+    def _find(self, address):
+        target = bytes.fromhex(address[2:].lower())
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            offset = self._offset(mid)
+            if self.mm[offset:offset + 20] < target:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self.count and self.mm[self._offset(lo):self._offset(lo) + 20] == target:
+            return lo
+        return None
+
+    def _read(self, slot):
+        offset = self._offset(slot)
+        address, index, amount, proof_len = PROOF_RECORD_PREFIX.unpack_from(self.mm, offset)
+        offset += PROOF_RECORD_PREFIX.size
+        proof = ['0x' + self.mm[offset + 32 * i:offset + 32 * (i + 1)].hex() for i in range(proof_len)]
+        return address, {'index': index, 'amount': str(int.from_bytes(amount, 'big')), 'proof': proof}
+
+    def get(self, address, default=None):
+        """Returns the claim for an address in the merkle_data_*.json claim layout"""
+        slot = self._find(address)
+        return default if slot is None else self._read(slot)[1]
+
+    def items(self):
+        for slot in range(self.count):
+            address, claim = self._read(slot)
+            yield to_checksum_address(address), claim
+
+    def close(self):
+        self.mm.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def iter_claims(path):
+    """Yields (address, claim) pairs from a merkle claim file of any format, streaming ndjson files line by line"""
+    if path.endswith('.bin'):
+        with ProofStore(path) as store:
+            yield from store.items()
+        return
+    with open(path, 'r') as f:
+        if path.endswith('.ndjson'):
+            next(f)
+            for line in f:
+                claim = json.loads(line)
+                yield claim.pop('address'), claim
+        else:
+            yield from json.load(f)['claims'].items()
+
+
+def load_merkle_data(path):
+    """Loads a merkle claim file of any format into the original merkle_data_*.json structure"""
+    if path.endswith('.bin'):
+        with ProofStore(path) as store:
+            return {'merkle_root': store.merkle_root, 'token_total': store.token_total, 'claims': dict(store.items())}
+    with open(path, 'r') as f:
+        if not path.endswith('.ndjson'):
+            return json.load(f)
+        data = json.loads(next(f))
+    data['claims'] = dict(iter_claims(path))
+    return data
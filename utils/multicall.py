@@ -0,0 +1,124 @@
+from brownie import web3
+from eth_abi import encode, decode
+from eth_utils import encode_hex
+from config import Config, ContractAddresses
+
+AGGREGATE3_SELECTOR = '0x82ad56cb'  # aggregate3((address,bool,bytes)[])
+
+
+class Multicall:
+    """
+    Collects contract reads and executes them through Multicall3 in as few eth_calls as possible,
+    all pinned to the same block. Reads are added as a brownie ContractCall plus its arguments,
+    e.g. `mc.add(PRISMA.balanceOf, VAULT)`, and execute() returns the decoded results in the
+    order they were added. Falls back to one eth_call per read on chains without Multicall3.
+    With an AsyncRPC engine the batches (or single reads) are sent concurrently through it.
+    """
+
+    def __init__(self, block_identifier=None, batch_size=None, rpc=None):
+        self.block_identifier = web3.eth.block_number if block_identifier is None else block_identifier
+        self.batch_size = batch_size or Config.MULTICALL_BATCH_SIZE
+        self.rpc = rpc
+        self.calls = []
+        self.positions = {}
+
+    def add(self, fn, *args, allow_failure=False):
+        """
+        Queues a read, returning its position in the results. Failed reads resolve to None when allowed.
+        Identical reads are only sent once and share a position.
+        """
+        calldata = fn.encode_input(*args)
+        key = (fn._address, calldata)
+        if key in self.positions:
+            position = self.positions[key]
+            if not allow_failure:
+                self.calls[position] = (fn, False, calldata)
+            return position
+        self.positions[key] = len(self.calls)
+        self.calls.append((fn, allow_failure, calldata))
+        return len(self.calls) - 1
+
+    def execute(self):
+        calls, self.calls, self.positions = self.calls, [], {}
+        if not calls:
+            return []
+        batched = has_multicall(self.block_identifier)
+        if self.rpc is not None:
+            return self._execute_async(calls, batched)
+        execute_batch = self._execute_batch if batched else self._execute_each
+        results = []
+        for i in range(0, len(calls), self.batch_size):
+            results += execute_batch(calls[i:i + self.batch_size])
+        return results
+
+    def _execute_batch(self, calls):
+        response = web3.eth.call(
+            {'to': ContractAddresses.MULTICALL3, 'data': encode_aggregate3(calls)},
+            self.block_identifier,
+        )
+        return decode_aggregate3(calls, response)
+
+    def _execute_async(self, calls, batched):
+        if batched:
+            batches = [calls[i:i + self.batch_size] for i in range(0, len(calls), self.batch_size)]
+            responses = self.rpc.call_many(
+                [(ContractAddresses.MULTICALL3, encode_aggregate3(batch)) for batch in batches],
+                self.block_identifier,
+            )
+            return [result for batch, response in zip(batches, responses) for result in decode_aggregate3(batch, response)]
+
+        responses = self.rpc.call_many(
+            [(fn._address, calldata) for fn, _, calldata in calls],
+            self.block_identifier,
+            return_exceptions=True,
+        )
+        results = []
+        for (fn, allow_failure, _), output in zip(calls, responses):
+            if isinstance(output, Exception):
+                if not allow_failure:
+                    raise output
+                results.append(None)
+            else:
+                results.append(fn.decode_output(encode_hex(output)))
+        return results
+
+    def _execute_each(self, calls):
+        results = []
+        for fn, allow_failure, calldata in calls:
+            try:
+                output = web3.eth.call({'to': fn._address, 'data': calldata}, self.block_identifier)
+            except Exception:
+                if not allow_failure:
+                    raise
+                results.append(None)
+            else:
+                results.append(fn.decode_output(encode_hex(output)))
+        return results
+
+
+def encode_aggregate3(calls):
+    data = encode(
+        ['(address,bool,bytes)[]'],
+        [[(fn._address, allow_failure, bytes.fromhex(calldata[2:])) for fn, allow_failure, calldata in calls]],
+    )
+    return AGGREGATE3_SELECTOR + data.hex()
+
+
+def decode_aggregate3(calls, response):
+    (returned,) = decode(['(bool,bytes)[]'], bytes(response))
+    return [
+        fn.decode_output(encode_hex(output)) if success else None
+        for (fn, _, _), (success, output) in zip(calls, returned)
+    ]
+
+
+def has_multicall(block_identifier='latest'):
+    return len(web3.eth.get_code(ContractAddresses.MULTICALL3, block_identifier)) > 0
+
+
+def multicall(calls, block_identifier=None, rpc=None):
+    """Executes a list of (ContractCall, *args) reads at one block and returns their results"""
+    mc = Multicall(block_identifier, rpc=rpc)
+    positions = [mc.add(fn, *args) for fn, *args in calls]
+    results = mc.execute()
+    return [results[i] for i in positions]
@@ -0,0 +1,123 @@
+import copy
+import json
+import os
+from brownie import Contract, ZERO_ADDRESS, web3
+from eth_utils import to_checksum_address
+from config import Config, ContractAddresses
+from utils.eth import get_logs_chunked
+from utils.multicall import multicall
+
+# Groups of addresses whose PRISMA balances feed the circulating supply, named as in compute_supply snapshots
+TRACKED_BALANCES = {
+    'vault_balance': [ContractAddresses.VAULT],
+    'fee_receiver_balance': [ContractAddresses.FEE_RECEIVER],
+    'locked_balance': [ContractAddresses.LOCKER],
+    'burn_balances': Config.BURN_ADDRESSES,
+}
+
+
+class SupplyTracker:
+    """
+    Keeps PRISMA total supply and the balances in TRACKED_BALANCES up to date by applying Transfer
+    events since the last checkpoint. Transfers from the zero address are mints and transfers to it
+    are burns, so the zero address itself is never credited. The checkpoint on disk only advances to
+    Config.REORG_DEPTH blocks below the head, and blocks above it are applied in memory on each query.
+    Every Config.SUPPLY_RECONCILE_INTERVAL blocks the balances are read in full to correct any drift.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or Config.SUPPLY_TRACKER_FILE
+        self.token = Contract(ContractAddresses.PRISMA)
+        tracked = {to_checksum_address(a) for group in TRACKED_BALANCES.values() for a in group}
+        self.accounts = sorted(tracked - {ZERO_ADDRESS})
+        self.checkpoint = self.load()
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return None
+        with open(self.path, 'r') as f:
+            return json.load(f)
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path, 'w') as f:
+            json.dump(self.checkpoint, f, indent=2)
+
+    def get_values(self, block):
+        """Returns total supply and the tracked balance groups at `block`, in wei"""
+        safe_block = min(block, web3.eth.block_number - Config.REORG_DEPTH)
+        if self.checkpoint is None:
+            self.checkpoint = self.read_state(safe_block)
+            self.save()
+        elif self.checkpoint['block'] > block:
+            # Older than the checkpoint, transfers can't be unapplied so read the balances directly
+            return self.to_values(self.read_state(block))
+
+        if self.checkpoint['block'] < safe_block:
+            self.apply(self.checkpoint, self.get_transfers(self.checkpoint['block'] + 1, safe_block))
+            self.checkpoint['block'] = safe_block
+            if safe_block - self.checkpoint['reconciled_block'] >= Config.SUPPLY_RECONCILE_INTERVAL:
+                self.reconcile()
+            self.save()
+
+        state = self.checkpoint
+        if state['block'] < block:
+            state = copy.deepcopy(state)
+            self.apply(state, self.get_transfers(state['block'] + 1, block))
+            state['block'] = block
+        return self.to_values(state)
+
+    def read_state(self, block):
+        """Reads total supply and every tracked balance at `block`"""
+        total_supply, *balances = multicall([
+            (self.token.totalSupply,),
+            *[(self.token.balanceOf, account) for account in self.accounts],
+        ], block)
+        return {
+            'block': block,
+            'reconciled_block': block,
+            'total_supply': int(total_supply),
+            'balances': {account: int(balance) for account, balance in zip(self.accounts, balances)},
+        }
+
+    def reconcile(self):
+        """Replaces the checkpoint with balances read on chain, reporting any drift from the tracked values"""
+        state = self.read_state(self.checkpoint['block'])
+        drift = {
+            key: state['balances'][key] - self.checkpoint['balances'].get(key, 0)
+            for key in self.accounts
+            if state['balances'][key] != self.checkpoint['balances'].get(key, 0)
+        }
+        if state['total_supply'] != self.checkpoint['total_supply']:
+            drift['total_supply'] = state['total_supply'] - self.checkpoint['total_supply']
+        if drift:
+            print(f'Supply tracker drifted at block {state["block"]:,}: {drift}')
+        self.checkpoint = state
+
+    def get_transfers(self, from_block, to_block):
+        """Returns the Transfer logs touching a tracked address or the zero address, in chain order"""
+        accounts = self.accounts + [ZERO_ADDRESS]
+        logs = {}
+        for argument in ('from', 'to'):
+            for log in get_logs_chunked(self.token, 'Transfer', from_block, to_block, argument_filters={argument: accounts}):
+                logs[(log.blockNumber, log.logIndex)] = log
+        return [logs[key] for key in sorted(logs)]
+
+    def apply(self, state, logs):
+        balances = state['balances']
+        for log in logs:
+            sender, receiver, value = log.args['from'], log.args['to'], log.args['value']
+            if sender == ZERO_ADDRESS:
+                state['total_supply'] += value
+            elif sender in balances:
+                balances[sender] -= value
+            if receiver == ZERO_ADDRESS:
+                state['total_supply'] -= value
+            elif receiver in balances:
+                balances[receiver] += value
+
+    def to_values(self, state):
+        values = {'total_supply': state['total_supply']}
+        for name, group in TRACKED_BALANCES.items():
+            values[name] = sum(state['balances'].get(to_checksum_address(a), 0) for a in group)
+        return values
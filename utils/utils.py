@@ -1,12 +1,21 @@
 import time
+from decimal import Decimal
 from functools import wraps
+from utils.instrument import instrument
 
 def func_timer(f):
+    """Prints how long a function took and records it as a span of the current instrumented run"""
     @wraps(f)
     def wrapper(*args, **kwargs):
-        start = time.time()
-        result = f(*args, **kwargs)
-        end = time.time()
+        start = time.perf_counter()
+        with instrument.span(f.__name__):
+            result = f(*args, **kwargs)
+        end = time.perf_counter()
         print(f'{f.__name__} took {end - start:.2f} seconds to execute')
         return result
     return wrapper
+
+
+def from_wei(value):
+    """Converts an integer wei amount to an exact Decimal token amount, for display only"""
+    return Decimal(int(value)).scaleb(-18)